@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    Compares matching a buffer line by line with batched regexes.
+
+    Runs a large buffer (think a long ``who`` list) through
+    :func:`sage.inbound.receiver` with a set of regex triggers, first
+    created normally and then with ``batch=True``. ::
+
+        python benchmarks/bench_batch.py [triggers] [lines]
+"""
+from __future__ import print_function
+from timeit import default_timer as clock
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import sage
+from sage.inbound import receiver
+
+
+def setup(count, batch):
+    group = sage.triggers.create_group('bench_batch', app='sage')
+
+    for i in range(count):
+        group.create('t%d' % i, 'regex', r'^(\w+) \w{%d}\s(\d+)$' % (i % 40 + 1),
+            batch=batch)
+
+    return group
+
+
+def lines(count):
+    return ['Person%d %s %d' % (i, 'x' * (i % 60 + 1), i) for i in range(count)]
+
+
+def run(buf, rounds=5):
+    best = None
+
+    for _ in range(rounds):
+        start = clock()
+        receiver(buf)
+        elapsed = clock() - start
+
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return best
+
+
+def main():
+    triggers = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    buf = lines(count)
+
+    group = setup(triggers, False)
+    lined = run(buf)
+    group.destroy()
+
+    group = setup(triggers, True)
+    batched = run(buf)
+    group.destroy()
+
+    print("%d triggers, %d lines" % (triggers, count))
+    print("per line: %.4fs" % lined)
+    print("batched:  %.4fs (%.2fx)" % (batched, lined / batched))
+
+
+if __name__ == '__main__':
+    main()
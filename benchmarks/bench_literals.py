@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    Compares the Aho-Corasick literal scan with a find per literal.
+
+    Times both over a set of lines for growing numbers of literals, to place
+    :attr:`sage.matching.MasterGroup.automaton_size`. ::
+
+        python benchmarks/bench_literals.py [iterations]
+"""
+from __future__ import print_function
+from timeit import timeit
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sage.matching import find_literals
+from sage.utils.ahocorasick import Automaton
+
+
+LINES = [
+    'Ada says, "The tide is turning, we should hurry."',
+    'A large black rat scurries in from the north.',
+    'You have recovered balance on all limbs.',
+    'Ada sits down and starts humming to herself.'
+]
+
+SIZES = (5, 10, 20, 40, 80, 160, 320)
+
+
+def literals(count):
+    return [' word%d ' % i for i in range(count - 1)] + [' rat ']
+
+
+def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    for size in SIZES:
+        keywords = literals(size)
+        automaton = Automaton(keywords)
+        keywords = tuple(keywords)
+
+        a = timeit(lambda: [automaton.scan(line) for line in LINES],
+            number=number)
+        f = timeit(lambda: [find_literals(keywords, line) for line in LINES],
+            number=number)
+
+        print("%4d literals  automaton: %.4fs  find: %.4fs (%.2fx)" % (size,
+            a, f, a / f))
+
+
+if __name__ == '__main__':
+    main()
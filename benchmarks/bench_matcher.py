@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    Compares the regular trigger loop with the compiled matcher.
+
+    Runs a buffer of lines through :func:`sage.inbound.receiver` with a set of
+    regex triggers no index can narrow down, once per mode. ::
+
+        python benchmarks/bench_matcher.py [triggers] [lines]
+"""
+from __future__ import print_function
+from timeit import default_timer as clock
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import sage
+from sage.inbound import receiver
+
+
+def setup(count):
+    group = sage.triggers.create_group('bench_matcher', app='sage')
+
+    for i in range(count):
+        # no required literal, so every trigger is run against every line
+        group.create('t%d' % i, 'regex', r'^[a-z]{%d}\s(\d+)$' % (i % 40 + 1))
+
+    return group
+
+
+def lines(count):
+    return ['%s %d' % ('x' * (i % 60 + 1), i) for i in range(count)]
+
+
+def run(buf, rounds=5):
+    best = None
+
+    for _ in range(rounds):
+        start = clock()
+        receiver(buf)
+        elapsed = clock() - start
+
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return best
+
+
+def main():
+    triggers = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+
+    group = setup(triggers)
+    buf = lines(count)
+
+    sage.triggers.compile(False)
+    loop = run(buf)
+
+    sage.triggers.compile()
+    compiled = run(buf)
+
+    sage.triggers.compile(False)
+    group.destroy()
+
+    print("%d triggers, %d lines" % (triggers, count))
+    print("loop:     %.4fs" % loop)
+    print("compiled: %.4fs (%.2fx)" % (compiled, loop / compiled))
+
+
+if __name__ == '__main__':
+    main()
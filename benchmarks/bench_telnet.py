@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    Compares the chunked telnet parser with the byte by byte one it replaced.
+
+    Feeds the same stream of lines, prompts and GMCP messages through
+    ``TelnetClient.dataReceived`` and the old per-byte loop, in packets of
+    the given size, recording the calls each makes without processing them.
+    ::
+
+        python benchmarks/bench_telnet.py [kilobytes] [packet size]
+"""
+from __future__ import print_function
+from timeit import default_timer as clock
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sage.net import TelnetClient, IAC, SB, SE, GA, CR, NL, GMCP, EORD, \
+    NOP, DM, BRK, IP, AO, AYT, EC, EL, WILL, WONT, DO, DONT
+from sage.utils import error
+
+
+class Recorder(TelnetClient):
+    """ Records the calls the parser makes instead of acting on them """
+
+    def __init__(self):
+        TelnetClient.__init__(self)
+        self.calls = []
+
+    def applicationDataReceived(self, data):
+        self.calls.append(('data', data))
+
+    def commandReceived(self, command, argument):
+        self.calls.append(('command', command, argument))
+
+    def negotiate(self, commands):
+        self.calls.append(('negotiate', ''.join(commands)))
+
+    def segmentReceived(self):
+        self.calls.append(('segment',))
+
+    def merged(self):
+        """ Calls with consecutive application data joined together """
+        merged = []
+
+        for call in self.calls:
+            if call[0] == 'data' and merged and merged[-1][0] == 'data':
+                merged[-1] = ('data', merged[-1][1] + call[1])
+            else:
+                merged.append(call)
+
+        return merged
+
+
+class ByteRecorder(Recorder):
+    """ The parser as it was, walking every byte """
+
+    def dataReceived(self, data):
+        appDataBuffer = []
+
+        for b in data:
+            if self.state == 'data':
+                if b == IAC:
+                    self.state = 'escaped'
+                elif b == '\r':
+                    self.state = 'newline'
+                else:
+                    appDataBuffer.append(b)
+            elif self.state == 'escaped':
+                if b == IAC:
+                    appDataBuffer.append(b)
+                    self.state = 'data'
+                elif b == SB:
+                    self.state = 'subnegotiation'
+                    self.commands = []
+                elif b in (GA, EORD, NOP, DM, BRK, IP, AO, AYT, EC, EL):
+                    self.state = 'data'
+                    if appDataBuffer:
+                        self.applicationDataReceived(''.join(appDataBuffer))
+                        del appDataBuffer[:]
+                    self.commandReceived(b, None)
+                    if b == EORD or b == GA:
+                        self.segmentReceived()
+                elif b in (WILL, WONT, DO, DONT):
+                    self.state = 'command'
+                    self.command = b
+                else:
+                    self.state = 'data'
+                    appDataBuffer.append(b)
+                    error("Unexpected signal: %s" % ord(b))
+            elif self.state == 'command':
+                self.state = 'data'
+                command = self.command
+                del self.command
+                if appDataBuffer:
+                    self.applicationDataReceived(''.join(appDataBuffer))
+                    del appDataBuffer[:]
+                self.commandReceived(command, b)
+            elif self.state == 'newline':
+                self.state = 'data'
+                if b == '\n':
+                    appDataBuffer.append('\n')
+                elif b == '\0':
+                    appDataBuffer.append('\r')
+                elif b == IAC:
+                    # IAC isn't really allowed after \r, according to the
+                    # RFC, but handling it this way is less surprising than
+                    # delivering the IAC to the app as application data.
+                    # The purpose of the restriction is to allow terminals
+                    # to unambiguously interpret the behavior of the CR
+                    # after reading only one more byte.  CR LF is supposed
+                    # to mean one thing (cursor to next line, first column),
+                    # CR NUL another (cursor to first column).  Absent the
+                    # NUL, it still makes sense to interpret this as CR and
+                    # then apply all the usual interpretation to the IAC.
+                    appDataBuffer.append('\r')
+                    self.state = 'escaped'
+                else:
+                    appDataBuffer.append('\r' + b)
+            elif self.state == 'subnegotiation':
+                if b == IAC:
+                    self.state = 'subnegotiation-escaped'
+                else:
+                    self.commands.append(b)
+            elif self.state == 'subnegotiation-escaped':
+                if b == SE:
+                    self.state = 'data'
+                    commands = self.commands
+                    del self.commands
+                    if appDataBuffer:
+                        self.applicationDataReceived(''.join(appDataBuffer))
+                        del appDataBuffer[:]
+                    self.negotiate(commands)
+                else:
+                    self.state = 'subnegotiation'
+                    self.commands.append(b)
+            else:
+                error("Invalid telnet state")
+
+        if appDataBuffer:
+            self.applicationDataReceived(''.join(appDataBuffer))
+
+def stream(kilobytes):
+    """ Typical game output: coloured lines ending in CRLF, prompts ending in
+        IAC GA and the odd GMCP message
+    """
+    chunks = []
+    size = 0
+    count = 0
+
+    while size < kilobytes * 1024:
+        for i in range(12):
+            line = '\x1b[1;37mA massive granite statue %d stands here, ' \
+                'gazing out over the square.\x1b[0;37m' % (count + i)
+            chunks.append(line + CR + NL)
+
+        chunks.append(IAC + SB + GMCP + 'Char.Vitals {"hp": "3120", '
+            '"mp": "2870", "string": "H:3120/3120 M:2870/2870"}' + IAC + SE)
+        chunks.append('3120h, 2870m ex-' + IAC + GA)
+
+        count += 12
+        size = sum(len(chunk) for chunk in chunks)
+
+    return ''.join(chunks)
+
+
+def run(klass, packets, rounds=5):
+    best = None
+
+    for _ in range(rounds):
+        client = klass()
+        start = clock()
+        for packet in packets:
+            client.dataReceived(packet)
+        elapsed = clock() - start
+
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return best, client.merged()
+
+
+def main():
+    kilobytes = int(sys.argv[1]) if len(sys.argv) > 1 else 512
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 1460
+
+    data = stream(kilobytes)
+    packets = [data[i:i + size] for i in range(0, len(data), size)]
+
+    bytewise, expected = run(ByteRecorder, packets)
+    chunked, calls = run(Recorder, packets)
+
+    assert calls == expected, "parsers disagree"
+
+    print("%d KB in %d byte packets" % (len(data) // 1024, size))
+    print("per byte: %.4fs" % bytewise)
+    print("chunked:  %.4fs (%.2fx)" % (chunked, bytewise / chunked))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    Compares a wildcard matchable with the equivalent regex.
+
+    Times ``match()`` of each directly on a matching and a non-matching
+    line. ::
+
+        python benchmarks/bench_wildcard.py [iterations]
+"""
+from __future__ import print_function
+from timeit import timeit
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import sage
+
+
+LINES = {
+    'hit': 'Ada says, "The tide is turning, we should hurry."',
+    'miss': 'Ada sits down and starts humming to herself.'
+}
+
+
+def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    group = sage.triggers.create_group('bench_wildcard', app='sage')
+    wildcard = group.create('wildcard', 'wildcard', '* says, "*"')
+    regex = group.create('regex', 'regex', r'^(.*?) says, "(.*?)"$',
+        ignorecase=False)
+
+    for name, line in sorted(LINES.items()):
+        w = timeit(lambda: wildcard.match(line), number=number)
+        r = timeit(lambda: regex.match(line), number=number)
+
+        print("%-4s wildcard: %.4fs  regex: %.4fs (%.2fx)" % (name, w, r,
+            r / w))
+
+    group.destroy()
+
+
+if __name__ == '__main__':
+    main()
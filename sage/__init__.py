@@ -76,5 +76,6 @@ _echo = None
 # methods defered to the prompt
 _deferred = list()
 
-from .api import echo, send, defer_to_prompt, delay, log, loopdelay
+from .api import echo, send, defer_to_prompt, delay, log, loopdelay, \
+    timers
 from .utils import error
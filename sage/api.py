@@ -3,6 +3,7 @@ from __future__ import absolute_import
 import sage
 from sage import config
 from twisted.internet import reactor, task
+from math import ceil
 import inspect
 from .utils import caller_name
 
@@ -52,17 +53,227 @@ def defer_to_prompt(method, *args):
     sage._deferred.append((method, args))
 
 
+class Timer(object):
+    """ A method call scheduled on a :class:`TimerWheel` """
+
+    __slots__ = ('time', 'deadline', 'method', 'args', 'kwargs', 'tag',
+        'wheel', 'called', 'cancelled')
+
+    def __init__(self, wheel, time, deadline, method, args, kwargs, tag):
+        #: reactor time the call is due at
+        self.time = time
+
+        #: wheel tick the call is due on
+        self.deadline = deadline
+
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+
+        #: tag the call can be cancelled by, see :meth:`TimerWheel.cancel_tag`
+        self.tag = tag
+
+        self.wheel = wheel
+        self.called = False
+        self.cancelled = False
+
+    def cancel(self):
+        """ Cancel the call if it hasn't happened yet """
+        if self.active():
+            self.wheel._discard(self)
+            self.cancelled = True
+
+    def active(self):
+        """ Is the call still to happen """
+        return not (self.called or self.cancelled)
+
+    def getTime(self):
+        return self.time
+
+    def __repr__(self):
+        return '<Timer %r at %.3f>' % (self.method, self.time)
+
+
+class TimerWheel(object):
+    """ Hashed timer wheel for delayed calls
+
+        All calls are driven by a single reactor call that runs every tick
+        while calls are pending. Scheduling and cancelling a call is O(1)
+        whatever the number of calls, calls due on the same tick are run
+        together, and calls can be tagged to cancel them all at once. Calls
+        never run early, but may run up to a tick late.
+
+        :param tick: (optional) seconds between ticks
+        :param slots: (optional) number of slots on the wheel
+        :param clock: (optional) reactor the wheel is driven by
+    """
+
+    def __init__(self, tick=0.01, slots=256, clock=None):
+        self.tick = tick
+        self.slots = slots
+
+        #: reactor the wheel is driven by
+        self.clock = reactor if clock is None else clock
+
+        # each slot holds the timers due on ticks that map to it
+        self._wheel = [set() for _ in range(slots)]
+
+        # tag -> set of timers
+        self._tags = {}
+
+        # reactor time tick 0 was at, reset whenever the wheel goes idle
+        self._start = None
+
+        # last tick processed
+        self._ticks = 0
+
+        self._call = None
+        self._pending = 0
+
+    def __len__(self):
+        return self._pending
+
+    def schedule(self, seconds, method, args=(), kwargs=None, tag=None):
+        """ Call a method after a number of seconds
+
+            :param seconds: seconds to delay by
+            :param method: method to call
+            :param args: (optional) arguments to call it with
+            :param kwargs: (optional) keyword arguments to call it with
+            :param tag: (optional) tag to cancel the call by
+            :returns: :class:`Timer`
+        """
+
+        now = self.clock.seconds()
+
+        if self._start is None:
+            self._start = now
+            self._ticks = 0
+
+        time = now + seconds
+        deadline = max(self._ticks + 1,
+            int(ceil((time - self._start) / self.tick)))
+
+        timer = Timer(self, time, deadline, method, args, kwargs or {}, tag)
+
+        self._wheel[deadline % self.slots].add(timer)
+        self._pending += 1
+
+        if tag is not None:
+            if tag not in self._tags:
+                self._tags[tag] = set()
+            self._tags[tag].add(timer)
+
+        if self._call is None:
+            self._call = self.clock.callLater(max(0,
+                self._start + (self._ticks + 1) * self.tick - now), self._tick)
+
+        return timer
+
+    def cancel_tag(self, tag):
+        """ Cancel every pending call with a tag
+
+            :returns: number of calls cancelled
+        """
+
+        timers = self._tags.pop(tag, ())
+
+        for timer in timers:
+            self._wheel[timer.deadline % self.slots].discard(timer)
+            timer.cancelled = True
+
+        self._pending -= len(timers)
+        self._idle()
+
+        return len(timers)
+
+    def _discard(self, timer):
+        self._wheel[timer.deadline % self.slots].discard(timer)
+        self._pending -= 1
+
+        if timer.tag is not None:
+            timers = self._tags.get(timer.tag)
+
+            if timers is not None:
+                timers.discard(timer)
+
+                if not timers:
+                    del(self._tags[timer.tag])
+
+        self._idle()
+
+    def _idle(self):
+        """ Stop ticking once nothing is pending """
+
+        if self._pending:
+            return
+
+        if self._call is not None:
+            if self._call.active():
+                self._call.cancel()
+
+            self._call = None
+
+        # the next call scheduled starts the wheel over
+        self._start = None
+        self._ticks = 0
+
+    def _tick(self):
+        self._call = None
+
+        now = self.clock.seconds()
+        target = max(self._ticks + 1, int((now - self._start) / self.tick))
+
+        # every slot is visited at most once, however many ticks were missed
+        due = []
+        for tick in xrange(max(self._ticks + 1, target - self.slots + 1),
+                target + 1):
+            slot = self._wheel[tick % self.slots]
+
+            for timer in slot:
+                if timer.deadline <= target:
+                    due.append(timer)
+
+        self._ticks = target
+
+        for timer in due:
+            self._discard(timer)
+            timer.called = True
+
+        due.sort(key=lambda timer: timer.time)
+
+        for timer in due:
+            try:
+                timer.method(*timer.args, **timer.kwargs)
+            except Exception:
+                sage._log.err()
+
+        if self._pending and self._call is None:
+            self._call = self.clock.callLater(max(0, self._start +
+                (self._ticks + 1) * self.tick - self.clock.seconds()),
+                self._tick)
+        elif not self._pending:
+            self._idle()
+
+
+#: timer wheel delayed matchables and :func:`delay` are scheduled on
+timers = TimerWheel()
+
+
 def delay(seconds, method, *args, **kwargs):
-    """ Delay a method call in the reactor
+    """ Delay a method call
+
+    Calls are scheduled on :data:`timers` and may run up to a tick late.
 
     :param seconds: seconds to delay by.
     :type seconds: int
     :param method: method to be called.
     :param \*args: optional arguments to be passed to the provided method.
     :param \*\*kwargs: optional keyword arguments.
+    :returns: :class:`Timer` that can be cancelled
     """
 
-    return reactor.callLater(seconds, method, *args, **kwargs)
+    return timers.schedule(seconds, method, args, kwargs)
 
 
 def loopdelay(seconds, func, immediate=True, *args, **kwargs):
@@ -232,6 +232,9 @@ class Apps(dict):
             self[name].unload()
 
         if name in self.groups:
+            sage.triggers.save_hits(name)
+            sage.aliases.save_hits(name)
+
             while len(self.groups[name]) > 0:
                 self.groups[name].pop().destroy()
 
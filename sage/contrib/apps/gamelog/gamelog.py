@@ -81,10 +81,12 @@ def write_ansi(**kwargs):
     for line in kwargs['lines']:
         log.debug(line.output)
 
-    log.debug(kwargs['ansi_prompt'])
+    if kwargs['ansi_prompt'] is not None:
+        log.debug(kwargs['ansi_prompt'])
 
 def write_raw(**kwargs):
     for line in kwargs['lines']:
         log.debug(line)
 
-    log.debug(kwargs['prompt'])
\ No newline at end of file
+    if kwargs['prompt'] is not None:
+        log.debug(kwargs['prompt'])
\ No newline at end of file
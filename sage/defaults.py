@@ -43,6 +43,14 @@ defaults = Configuration({
     'auto_reload': True,
     'exit_on_disconnect': False,
     'serverside_command_separator': '&&',
+    # Bytes gathered without a prompt before the complete lines are processed
+    # and sent on anyway
+    'max_segment_size': 1048576,
+    # Send lines on before the prompt arrives, once there are stream_lines of
+    # them or stream_ms milliseconds have passed
+    'stream_output': False,
+    'stream_lines': 100,
+    'stream_ms': 100,
     # Path to private key (pub is derived from that), does not support passphrases
     'ssh_key_path': '~/.ssh/ssh_host_key'
 })
@@ -1,14 +1,19 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import
 from sage.ansi import filter_ansi
+from sage.utils import cached_property
 import sage
 
 
 class Line(str):
     """ An individual line in sage's buffer
 
+        The line itself is the text with ANSI codes filtered out.
+
         :attribute raw: the original 'raw' value of the line
         :attribute output: output that will be sent to the client
+        :attribute folded: lowercased line for case-insensitive matching,
+            computed once on first use
     """
 
     def __new__(cls, string):
@@ -17,6 +22,10 @@ class Line(str):
         line.output = string
         return line
 
+    @cached_property
+    def folded(self):
+        return self.lower()
+
     def gag(self):
         """ Gag the line """
         self.output = None
@@ -52,30 +61,35 @@ class Buffer(list):
         return str(self.__class__)
 
 
-def receiver(lines):
-    """ Receives lines since the last prompt """
+def receiver(lines, final=True):
+    """ Receives lines since the last prompt
+
+        :param final: (optional) False if the lines aren't followed by the
+            prompt yet. Methods deferred to the prompt are then left for it.
+    """
 
     sage.buffer = buf = Buffer(lines)
-    trigs = sage.triggers.enabled
+    triggers = sage.triggers
 
-    sage.triggers.in_loop = True
-    # run trigger matching over lines
-    for line in buf:
-        for trigger in trigs:
-            if trigger.enabled:
-                trigger.match(line)
+    # batched regexes run over the whole buffer up front
+    batched = triggers.scan_buffer(buf)
 
-        sage.triggers.flush_set()
+    triggers.in_loop = True
+    # run trigger matching over lines
+    for line, candidates in zip(buf, batched):
+        triggers.match(line, candidates)
+        triggers.flush_set()
 
-    sage.triggers.in_loop = False
+    triggers.in_loop = False
 
-    # since the prompt has already run, we execute deferred methods here
-    for method, args in sage._deferred:
+    if final:
+        # since the prompt has already run, we execute deferred methods here
+        for method, args in sage._deferred:
 
-        if method is not None:
-            method(*args)
+            if method is not None:
+                method(*args)
 
-    sage._deferred = list()
+        sage._deferred = list()
 
     output = [line.output for line in sage.buffer if line.output != None]
 
@@ -6,11 +6,26 @@
     both are identical. The only difference is where they occur in execution.
 """
 from __future__ import absolute_import
+from collections import deque
+from itertools import count
+import bisect
+import heapq
+import json
+import os
 import re
+import sre_parse
+from sre_constants import LITERAL, SUBPATTERN, MAX_REPEAT, MIN_REPEAT, \
+    BRANCH, ASSERT, ASSERT_NOT, AT, AT_BEGINNING_STRING, AT_END_STRING, \
+    GROUPREF, GROUPREF_EXISTS
 from time import time
-from sage.dispatch.signal import Hook
-from sage import apps
-from sage.api import defer_to_prompt
+from timeit import default_timer as clock
+from sage.dispatch.signal import WeakMethod, _make_id
+from sage.utils.ahocorasick import Automaton
+from sage.utils.lru import LRUCache
+from sage.profiling import profiler, _path
+from sage.utils import json_str_load
+from sage import apps, _log
+from sage.api import defer_to_prompt, timers
 from twisted.internet import reactor
 import weakref
 
@@ -35,9 +50,75 @@ class OrphanedMatchableGroupError(Exception):
     pass
 
 
+class Match(object):
+    """ A single successful match of a matchable
+
+        Passed to bound methods in place of the matchable, so delayed methods
+        and later matches never overwrite each other's state. Anything that
+        isn't part of the match is looked up on the matchable, so
+        ``trigger.disable()`` and ``trigger.parent()`` keep working.
+    """
+
+    __slots__ = ('matchable', 'line', 'time', 'prefix', 'suffix', 'matchobj')
+
+    def __init__(self, matchable, line, prefix=None, suffix=None,
+            matchobj=None):
+
+        #: matchable that matched
+        self.matchable = matchable
+
+        #: matched line
+        self.line = line
+
+        #: time match occurred
+        self.time = time()
+
+        #: text before matching pattern (substring and endswith only)
+        self.prefix = prefix
+
+        #: text after matching pattern (substring and startswith only)
+        self.suffix = suffix
+
+        #: re.MatchObject (regex only)
+        self.matchobj = matchobj
+
+    @property
+    def groups(self):
+        """ re.MatchObject.groups() - regex groups as a tuple (regex only) """
+        if self.matchobj is None:
+            return None
+
+        return self.matchobj.groups()
+
+    def replay_args(self):
+        """ Arguments to :meth:`Matchable.successful_match`, after the line,
+            that recreate the match. Kept by the line cache.
+        """
+        return (self.prefix, self.suffix, self.matchobj)
+
+    def __getattr__(self, name):
+        return getattr(self.matchable, name)
+
+    def __repr__(self):
+        return "<Match %s: %r>" % (self.matchable.name, self.line)
+
+
+# creation order of matchables
+_serial = count()
+
+
 class Matchable(object):
     """ Base class for a trigger or alias """
 
+    __slots__ = ('name', 'pattern', 'literal', 'enabled', 'delay',
+        'disable_on_match', 'disable_on_prompt', 'gag', 'intercept', 'type',
+        'timer', 'parent', 'priority', 'order', 'rate', 'post_output',
+        'methods', '__weakref__')
+
+    #: name of the master group index the matchable is kept in. Matchables
+    #: without an index are scanned against every line.
+    index = None
+
     def __init__(self, **kwargs):
         #: name of the matchable.
         self.name = kwargs.pop('name', None)
@@ -45,10 +126,12 @@ class Matchable(object):
         #: pattern matched against.
         self.pattern = kwargs.pop('pattern', None)
 
+        #: literal the master group indexes the matchable by
+        self.literal = self.pattern
+
         #: enabled.
         self.enabled = kwargs.pop('enabled', None)
 
-        #: methods bound to the matchable.
         methods = kwargs.pop('methods', None)
 
         #: seconds execution is delayed by after match. None to disable.
@@ -70,27 +153,32 @@ class Matchable(object):
 
         self.timer = None
 
-        #: matched line
-        self.line = None
+        parent = kwargs.pop('parent')
 
-        #: time match occurred
-        self.time = None
+        #: parent group
+        self.parent = weakref.ref(parent)
 
-        #: text before matching pattern (substring and endswith only)
-        self.prefix = None
+        priority = kwargs.pop('priority', None)
 
-        #: text after matching mattern (substring and startswith only)
-        self.suffix = None
+        #: higher priority matchables are run first. Defaults to the group's.
+        self.priority = parent.priority if priority is None else priority
 
-        #: parent group
-        self.parent = weakref.ref(kwargs.pop('parent'))
+        #: sort key the master group runs matchables in. Matchables of equal
+        #: priority run in the order they were created.
+        self.order = (-self.priority, next(_serial))
 
-        #: re.MatchObject (regex only)
-        self.matchobj = None
+        #: hits, decayed over time (matchables of adaptive groups only)
+        self.rate = 0.0
+
+        post_output = kwargs.pop('post_output', None)
 
-        #: re.MatchObject.groups() - regex groups as a list (regex only)
-        self.groups = None
+        #: run bound methods after the output has been sent. Defaults to the
+        #: group's.
+        self.post_output = parent.post_output if post_output is None \
+            else post_output
 
+        #: methods bound to the matchable as (key, callable, param) tuples.
+        #: Bound methods are held through a WeakMethod.
         self.methods = []
 
         if methods:
@@ -103,6 +191,11 @@ class Matchable(object):
                 else:
                     self.bind(method)
 
+    @property
+    def active(self):
+        """ Is the matchable and every group above it enabled """
+        return bool(self.enabled) and self.parent().active
+
     def enable(self):
         """ Enable the matchable """
         self.parent()._enable(self)
@@ -118,28 +211,41 @@ class Matchable(object):
         self.parent()._remove_child(self)
 
     def bind(self, method, param=None):
-        """ Add a method to a matchable """
+        """ Add a method to a matchable
 
-        if param is not None:
-            signal = Hook(providing_args=['param'])
-        else:
-            signal = Hook()
+            Functions are referenced directly. Methods bound to an instance
+            are referenced weakly and are dropped once the instance is gone.
+        """
 
-        signal.connect(method)
+        if hasattr(method, '__self__') and hasattr(method, '__func__'):
+            target = WeakMethod(method)
+        else:
+            target = method
 
-        self.methods.append((
-            signal,
-            param
-        ))
+        self.methods.append((_make_id(method), target, param))
 
     def unbind(self, method):
         """ Remove a method from a matchable """
-        self.methods.disconnect(method)
 
-    def successful_match(self, line):
-        """ Called when the matchable successfully matches """
-        self.line = line
-        self.time = time()
+        key = _make_id(method)
+
+        self.methods = [bound for bound in self.methods if bound[0] != key]
+
+    def successful_match(self, line, prefix=None, suffix=None,
+            matchobj=None):
+        """ Called when the matchable successfully matches
+
+            :returns: the :class:`Match` passed to bound methods
+        """
+        match = Match(self, line, prefix, suffix, matchobj)
+
+        if self.gag:
+            line.gag()
+
+        return self._matched(match)
+
+    def _matched(self, match):
+        """ Disable as needed and run or schedule the bound methods """
 
         if self.disable_on_match:
             self.disable()
@@ -147,28 +253,54 @@ class Matchable(object):
         if self.disable_on_prompt:
             defer_to_prompt(self.disable)
 
-        if self.gag:
-            self.line.gag()
-
         if self.delay:
-            self.timer = reactor.callLater(self.delay, self.call_methods)
+            self.timer = timers.schedule(self.delay, self.call_methods,
+                (match,), tag=self.parent())
+        elif self.post_output:
+            self.parent()._master().post(self.call_methods, match)
         else:
-            self.call_methods()
+            self.call_methods(match)
 
-        return True
+        return match
 
-    def call_methods(self):
-        """ Send to all bound methods """
-        for signal, param in self.methods:
-            if param:
-                signal.send(self, param)
-            else:
-                signal.send(self)
+    def call_methods(self, match=None):
+        """ Send to all bound methods
+
+            :param match: (optional) :class:`Match` passed to the methods.
+                Without one they get the matchable itself.
+        """
+
+        if match is None:
+            match = self
+
+        dead = False
+
+        for _, method, param in self.methods:
+            if type(method) is WeakMethod:
+                method = method()
+
+                if method is None:
+                    dead = True
+                    continue
+
+            try:
+                if param is None:
+                    method(match)
+                else:
+                    method(match, param)
+            except Exception:
+                _log.err()
+
+        if dead:
+            self.methods = [bound for bound in self.methods
+                if type(bound[1]) is not WeakMethod or bound[1]() is not None]
 
 
 class CIMatchable(Matchable):
     """ Case-insensitive matchable """
 
+    __slots__ = ()
+
     def __init__(self, **kwargs):
 
         kwargs['pattern'] = kwargs['pattern'].lower()
@@ -179,6 +311,11 @@ class CIMatchable(Matchable):
 class Exact(Matchable):
     """ Exact-match matchable """
 
+    __slots__ = ()
+
+    #: looked up by the master group instead of being scanned
+    index = 'exact'
+
     def match(self, line):
 
         if self.pattern == line:
@@ -190,9 +327,13 @@ class Exact(Matchable):
 class CIExact(CIMatchable):
     """ Case-insensitive exact-match matchable """
 
+    __slots__ = ()
+
+    index = 'ci_exact'
+
     def match(self, line):
 
-        if self.pattern == line.lower():
+        if self.pattern == fold(line):
             return self.successful_match(line)
 
         return False
@@ -201,23 +342,42 @@ class CIExact(CIMatchable):
 class Substring(Matchable):
     """ Substring matchable """
 
+    __slots__ = ()
+
+    #: found by the master group's literal scan
+    index = 'literal'
+
     def match(self, line):
 
-        if self.pattern in line:
-            self.prefix, self.suffix = line.split(self.pattern)
-            return self.successful_match(line)
+        start = line.find(self.pattern)
+
+        if start != -1:
+            return self._found(line, start)
 
         return False
 
+    def match_span(self, line, first, last):
+        """ Called with the first and last offsets the pattern occurs at """
+        return self._found(line, first)
+
+    def _found(self, line, start):
+        return self.successful_match(line, prefix=line[:start],
+            suffix=line[start + len(self.pattern):])
 
-class CISubstring(CIMatchable):
+
+class CISubstring(CIMatchable, Substring):
     """ Case-insensitive substring matchable """
 
+    __slots__ = ()
+
+    index = 'ci_literal'
+
     def match(self, line):
 
-        if self.pattern in line.lower():
-            self.prefix, self.suffix = line.split(self.pattern)
-            return self.successful_match(line)
+        start = fold(line).find(self.pattern)
+
+        if start != -1:
+            return self._found(line, start)
 
         return False
 
@@ -225,6 +385,9 @@ class CISubstring(CIMatchable):
 class Regex(Matchable):
     """ Regular expression matchable """
 
+    __slots__ = ('index', 'batch', 'shared', 'prefilter_runs',
+        '_prefilter_lines', '_prefilter_since')
+
     def __init__(self, **kwargs):
 
         flags = 0
@@ -234,530 +397,2254 @@ class Regex(Matchable):
 
         del(kwargs['ignorecase'])
 
-        kwargs['pattern'] = re.compile(kwargs['pattern'], flags=flags)
+        batch = kwargs.pop('batch', False)
+
+        kwargs['pattern'] = intern_regex(kwargs['pattern'], flags)
 
         Matchable.__init__(self, **kwargs)
 
-    def match(self, line):
+        #: another enabled regex of the master group has the same pattern.
+        #: The pattern is then run once per line for all of them.
+        self.shared = False
 
-        match = self.pattern.match(line)
+        #: matched a whole buffer at a time together with the other batched
+        #: regexes. Only if the regex can be combined with others.
+        self.batch = bool(batch) and batchable(self.pattern)
 
-        if match:
-            self.matchobj = match
-            self.groups = match.groups()
-            return self.successful_match(line)
+        #: text every match must contain. The regex is only run on lines the
+        #: master group's literal scan finds it in.
+        self.literal = required_literal(self.pattern)
+        self.index = None
 
-        return False
+        if self.batch:
+            if self.pattern.flags & re.IGNORECASE:
+                self.index = 'ci_batch'
+            else:
+                self.index = 'batch'
+        elif self.literal is not None:
+            if self.pattern.flags & re.IGNORECASE:
+                self.literal = self.literal.lower()
+                self.index = 'ci_prefilter'
+            else:
+                self.index = 'prefilter'
 
+        #: lines the regex was run on after passing the prefilter
+        self.prefilter_runs = 0
 
-class Startswith(Matchable):
-    """ Starts-with string matchable """
+        self._prefilter_lines = 0
+        self._prefilter_since = None
 
-    def match(self, line):
+    @property
+    def prefilter_skips(self):
+        """ Lines the regex was enabled for but not run on """
+        lines = self._prefilter_lines
 
-        if line.startswith(self.pattern):
-            self.suffix = line.split(self.pattern)[1]
-            return self.successful_match(line)
+        if self._prefilter_since is not None:
+            parent = self.parent()
 
-        return False
+            # destroyed
+            if parent is None:
+                return 0
 
+            lines += parent._master().lines - self._prefilter_since
 
-class CIStartswith(CIMatchable):
-    """ Case-insensitive starts-with string matchable """
+        return lines - self.prefilter_runs
 
     def match(self, line):
 
-        if line.lower().startswith(self.pattern):
-            self.suffix = line.split(self.pattern)[1]
-            return self.successful_match(line)
+        if self.shared:
+            # another owner of the pattern may have run it on this line
+            last = _results.get(self.pattern)
+
+            if last is not None and last[0] is line:
+                match = last[1]
+            else:
+                match = self._search(line)
+                _results[self.pattern] = (line, match)
+        elif _budgets and self.type in _budgets:
+            match = self._search(line)
+        else:
+            match = self.pattern.match(line)
+
+        if match:
+            return self.successful_match(line, matchobj=match)
 
         return False
 
+    def _search(self, line):
+        if _budgets and self.type in _budgets:
+            start = clock()
+            match = self.pattern.match(line)
+            _budgets[self.type].check(self, line, clock() - start)
+            return match
 
-class Endswith(Matchable):
-    """ Ends-with string matchable """
+        return self.pattern.match(line)
 
-    def match(self, line):
 
-        if line.endswith(self.pattern):
-            self.prefix = line.split(self.pattern)[0]
-            return self.successful_match(line)
+# (pattern, flags) -> compiled regex shared by every matchable using it
+_interned = weakref.WeakValueDictionary()
 
-        return False
+# shared compiled regex -> (line, match object) it last ran on
+_results = {}
 
 
-class CIEndswith(CIMatchable):
-    """ Case-insensitive ends-with string matchable """
+def intern_regex(pattern, flags=0):
+    """ Compile a regex, reusing the compiled regex of any other matchable
+        with the same pattern and flags
 
-    def match(self, line):
+        :param pattern: regular expression
+        :param flags: (optional) ``re`` flags
+    """
 
-        if self.line.lower().endswith(self.pattern):
-            self.prefix = line.split(self.pattern)[0]
-            return self.successful_match(line)
+    key = (pattern, flags)
+    regex = _interned.get(key)
 
-        return False
+    if regex is None:
+        regex = _interned[key] = re.compile(pattern, flags)
 
+    return regex
 
-class Group(object):
-    """ Base matchable group """
 
-    def __init__(self, name, parent, app, enabled=True):
-        self.name = name
-        self.parent = weakref.ref(parent)
-        self.app = app
-        self.enabled = enabled
+def fold(line):
+    """ Lowercased line, using the cached :attr:`sage.inbound.Line.folded`
+        when there is one
+    """
+    try:
+        return line.folded
+    except AttributeError:
+        return line.lower()
 
-        self.groups = {}
-        self.matchables = {}
 
-        if apps.valid(app) is False:
-            raise AppNotFound("Unable to find app named '%s'" % app)
+# matchable type -> Budget of master groups guarding their regexes
+_budgets = {}
 
-        apps.add_group(app, self)
 
-    def create(self,
-        name,
-        mtype,
-        pattern,
-        methods=[],
-        enabled=True,
-        ignorecase=True,
-        delay=None,
-        disable_on_match=False,
-        disable_on_prompt=False,
-        gag=False,
-        intercept=True):
-        """ Create a trigger or alias (depending on the master group)
+class Budget(object):
+    """ Time budget for a single regex evaluation, see
+        :meth:`MasterGroup.guard`
+    """
 
-            :param name: name of the matchable.
-            :type name: string
-            :param mtype: 'type' of matchable. Must be 'exact', 'substring',
-                'regex', 'startswith', or 'endswith'.
-            :type mtype: string
-            :param pattern: pattern to match against.
-            :type pattern: string
-            :param methods: (optional) methods to bind to the matchable.
-            :type methods: list
-            :param enabled: (optional) is the matchable enabled.
-            :type enabled: bool
-            :param ignorecase: (optional) is the matchable case-insensitive.
-            :type ignorecase: bool
-            :param delay: (optional) how many seconds to delay execution of
-                bound methods after a successful match.
-            :type delay: int or None
-            :param disable_on_match: (optional) disable matchable after a
-                successful match.
-            :type disable_on_match: bool
-            :param disable_on_prompt: (optional) disable matchable after a
-                successful match on the following prompt.
-            :type disable_on_prompt: bool
-            :param gag: (optional) gag the line on a match.
-            :type gag: bool
-            :param intercept: (optional) -aliases only- Intercept the output of
-                the command being sent.
-            :type intercept: bool
-        """
+    def __init__(self, seconds, disable=False):
+        #: seconds a regex may take on a line
+        self.seconds = seconds
 
-        kwargs = {
-            'name': name,
-            'pattern': pattern,
-            'methods': methods,
-            'enabled': enabled,
-            'delay': delay,
-            'disable_on_match': disable_on_match,
-            'disable_on_prompt': disable_on_prompt,
-            'gag': gag,
-            'intercept': intercept,
-            'parent': self,
-            'group_type': self.group_type
-        }
+        #: disable regexes going over budget
+        self.disable = disable
 
-        if mtype == 'exact':
-            m = CIExact(**kwargs) if ignorecase is False \
-                else Exact(**kwargs)
-        elif mtype == 'substring':
-            m = CISubstring(**kwargs) if ignorecase is False  \
-                else Substring(**kwargs)
-        elif mtype == 'regex':
-            kwargs['ignorecase'] = ignorecase
-            m = Regex(**kwargs)
-        elif mtype == 'startswith':
-            m = CIStartswith(**kwargs) if ignorecase is False \
-                else Startswith(**kwargs)
-        elif mtype == 'endswith':
-            m = CIEndswith(**kwargs) if ignorecase is False \
-                else Endswith(**kwargs)
-        else:
-            raise InvalidMatchableType('Unsupported matchable type: %s' % mtype)
+        #: matchable path -> times it went over budget
+        self.overruns = {}
 
-        self.matchables[name] = m
+    def check(self, instance, line, elapsed):
+        """ Called with the time a regex took on a line """
 
-        if enabled:
-            self.parent()._enable(m)
+        if elapsed <= self.seconds:
+            return
 
-        return m
+        path = _path(instance)
+        self.overruns[path] = self.overruns.get(path, 0) + 1
 
-    def disable(self, name=None, child=False):
-        """ Disable a group or matchable
+        _log.msg("Regex %s '%s' took %.3fs (budget %.3fs) on line: %r" % (
+            instance.type, path, elapsed, self.seconds, str(line)))
 
-            If called without a parameter, will disable the group being called.
-            If name is provided, it will do a :meth:`get`
-            lookup and call :meth:`disable` on that object.
+        if self.disable and instance.enabled:
+            _log.msg("Disabled %s '%s' for going over budget" % (
+                instance.type, path))
+            instance.disable()
 
-            :param name: (optional) matchable query string
-        """
 
-        if name is None:
-            if child is False:
-                self.enabled = False
+def nested_quantifier(regex):
+    """ Does a regex repeat something that repeats a variable number of times
+        itself, like ``(a+)+`` or ``(\\w*\\s?)*``
 
-            for instance in self.matchables.values():
-                self.parent()._disable(instance)
+        Such patterns can backtrack catastrophically on lines they almost
+        match.
 
-            for group in self.groups.values():
-                group.disable(child=True)
+        :param regex: compiled regular expression
+    """
 
-            return True
-        else:
-            target = self.get(name)
+    try:
+        parsed = sre_parse.parse(regex.pattern, regex.flags)
+    except Exception:
+        return False
 
-            if target:
-                target.disable()
+    return _nested_quantifier(parsed, False)
+
+
+def _nested_quantifier(parsed, repeated):
+    for op, av in parsed:
+        if op in (MAX_REPEAT, MIN_REPEAT):
+            low, high, body = av
+            variable = high > 1 and high != low
+
+            if repeated and variable:
                 return True
 
-    def destroy(self):
-        """ Destroys (deletes) the group """
-        for matchable in self.matchables.values():
-            matchable.destroy()
+            if _nested_quantifier(body, repeated or high > 1):
+                return True
+        elif op == SUBPATTERN:
+            if _nested_quantifier(av[-1], repeated):
+                return True
+        elif op == BRANCH:
+            for branch in av[1]:
+                if _nested_quantifier(branch, repeated):
+                    return True
+        elif op in (ASSERT, ASSERT_NOT):
+            if _nested_quantifier(av[1], repeated):
+                return True
 
-        for child_group in self.groups.values():
-            child_group.destroy()
+    return False
 
-        self.parent()._remove_group(self.name)
 
-    def debug(self, indent=0):
-        """ Print out a visual representation of all child matchables and groups
+def batchable(regex):
+    """ Can a regex be merged into an alternation with others and run over
+        many lines at once without changing what it matches
 
-            :param indent: (optional) number of tabs to ident by
-            :type indent: integer
-        """
+        Regexes with backreferences, named groups, lookarounds, ``\\A``,
+        ``\\Z`` or flags other than IGNORECASE can't.
 
-        for name, g in self.groups.iteritems():
-            print("%s<%s [%s]>" % ('\t' * indent, name, '+' if g.enabled else ' '))
-            g.debug(indent+1)
+        :param regex: compiled regular expression
+    """
 
-        for name, m in self.matchables.iteritems():
-            print("%s-%s [%s]" % ('\t' * indent, name, '+' if m.enabled else ' '))
+    if regex.flags & ~re.IGNORECASE or regex.groupindex:
+        return False
 
+    try:
+        parsed = sre_parse.parse(regex.pattern, regex.flags)
+    except Exception:
+        return False
 
-    def enable(self, name=None, child=False):
-        """ Enable a group or matchable
+    return _batchable(parsed)
 
-            If called without a parameter, will enable the group being called.
-            If name is provided, it will do a :meth:`get`
-            lookup and call :meth:`enable` on that object.
 
-            :param name: (optional) matchable query string
-        """
+def _batchable(parsed):
+    for op, av in parsed:
+        if op in (GROUPREF, GROUPREF_EXISTS):
+            return False
+        elif op == AT and av in (AT_BEGINNING_STRING, AT_END_STRING):
+            return False
+        elif op in (ASSERT, ASSERT_NOT):
+            # in the joined buffer lookbehinds would see the end of the
+            # previous line and lookaheads the start of the next
+            return False
+        elif op == SUBPATTERN:
+            if not _batchable(av[-1]):
+                return False
+        elif op in (MAX_REPEAT, MIN_REPEAT):
+            if not _batchable(av[2]):
+                return False
+        elif op == BRANCH:
+            for branch in av[1]:
+                if not _batchable(branch):
+                    return False
 
-        if name is None:
-            if child is False:
-                self.enabled = True
-
-            for instance in self.matchables.values():
-                if instance.enabled:
-                    self.parent()._enable(instance)
-            for group in self.groups.values():
-                if group.enabled:
-                    group.enable(child=True)
-            return True
-        else:
-            target = self.get(name)
+    return True
 
-            if target:
-                target.enable()
-                return True
 
+def required_literal(regex):
+    """ Find the longest literal string any match of a regex must contain
 
-    def create_group(self, name, app=None, enabled=True):
-        """ Creates a child group
+        :param regex: compiled regular expression
+        :returns: the literal, or None if the regex doesn't have one
+    """
 
-            :param name: name of group
-            :param app: name of app the group belongs to. If not set will be
-                the group's parent's app.
-            :param enabled: (optional) if group is enabled
-            :type enabled: bool
-        """
-        if name in self.groups:
-            return self.groups[name]
+    if regex.flags & (re.LOCALE | re.UNICODE):
+        return None
 
-        if app is None:
-            if self.app is None:
-                raise OrphanedMatchableGroupError(
-                "Top-level group '%s' must have an app declared in "
-                "create_group()" % name)
-            app = self.app
-        elif apps.valid(app) is False:
+    try:
+        parsed = sre_parse.parse(regex.pattern, regex.flags)
+    except Exception:
+        return None
+
+    literals = []
+    _collect_literals(parsed, literals)
+
+    if not literals:
+        return None
+
+    return max(literals, key=len)
+
+
+def _collect_literals(parsed, literals):
+    run = []
+
+    for op, av in parsed:
+        if op == LITERAL:
+            run.append(chr(av))
+            continue
+
+        if run:
+            literals.append(''.join(run))
+            run = []
+
+        # the contents of groups and of repeats that must occur at least
+        # once are required as well
+        if op == SUBPATTERN:
+            _collect_literals(av[-1], literals)
+        elif op in (MAX_REPEAT, MIN_REPEAT) and av[0] > 0:
+            _collect_literals(av[2], literals)
+
+    if run:
+        literals.append(''.join(run))
+
+
+def find_literals(literals, text):
+    """ Find literals in text with a find per literal
+
+        Same results as :meth:`Automaton.scan`. For a few literals the
+        searches in C beat a pass over the text in Python.
+
+        :param literals: sequence of strings to search for
+        :param text: string to search
+        :returns: dict of literal -> (first, last) offsets the literal starts
+            at in text
+    """
+
+    found = {}
+
+    for literal in literals:
+        first = text.find(literal)
+
+        if first != -1:
+            found[literal] = (first, text.rfind(literal))
+
+    return found
+
+
+class Startswith(Matchable):
+    """ Starts-with string matchable """
+
+    __slots__ = ()
+
+    index = 'literal'
+
+    def match(self, line):
+
+        if line.startswith(self.pattern):
+            return self._found(line)
+
+        return False
+
+    def match_span(self, line, first, last):
+        """ Called with the first and last offsets the pattern occurs at """
+        if first != 0:
+            return False
+
+        return self._found(line)
+
+    def _found(self, line):
+        return self.successful_match(line, suffix=line[len(self.pattern):])
+
+
+class CIStartswith(CIMatchable, Startswith):
+    """ Case-insensitive starts-with string matchable """
+
+    __slots__ = ()
+
+    index = 'ci_literal'
+
+    def match(self, line):
+
+        if fold(line).startswith(self.pattern):
+            return self._found(line)
+
+        return False
+
+
+class Endswith(Matchable):
+    """ Ends-with string matchable """
+
+    __slots__ = ()
+
+    index = 'literal'
+
+    def match(self, line):
+
+        if line.endswith(self.pattern):
+            return self._found(line)
+
+        return False
+
+    def match_span(self, line, first, last):
+        """ Called with the first and last offsets the pattern occurs at """
+        if last + len(self.pattern) != len(line):
+            return False
+
+        return self._found(line)
+
+    def _found(self, line):
+        return self.successful_match(line,
+            prefix=line[:len(line) - len(self.pattern)])
+
+
+class CIEndswith(CIMatchable, Endswith):
+    """ Case-insensitive ends-with string matchable """
+
+    __slots__ = ()
+
+    index = 'ci_literal'
+
+    def match(self, line):
+
+        if fold(line).endswith(self.pattern):
+            return self._found(line)
+
+        return False
+
+
+class WildcardMatch(Match):
+    """ A successful match of a :class:`Wildcard` """
+
+    __slots__ = ('captures',)
+
+    def __init__(self, matchable, line, captures):
+        Match.__init__(self, matchable, line)
+
+        #: text matched by each ``*``
+        self.captures = captures
+
+    @property
+    def groups(self):
+        """ text matched by each ``*`` as a tuple """
+        return self.captures
+
+    def replay_args(self):
+        return (self.captures,)
+
+
+class Wildcard(Matchable):
+    """ Wildcard matchable
+
+        ``*`` in the pattern matches any text (including none) and everything
+        else is matched literally against the whole line, e.g.
+        ``* says, "*"``. Matched with string methods only, never a regex.
+    """
+
+    __slots__ = ('index', 'head', 'middle', 'tail', 'capture')
+
+    #: index used when the pattern has a literal
+    literal_index = 'literal'
+
+    def __init__(self, **kwargs):
+
+        Matchable.__init__(self, **kwargs)
+
+        segments = self.pattern.split('*')
+
+        #: literal the line must start with
+        self.head = segments[0]
+
+        #: literals found in order between the wildcards
+        self.middle = segments[1:-1]
+
+        #: literal the line must end with, None without wildcards
+        self.tail = segments[-1] if len(segments) > 1 else None
+
+        # index by the leading literal, or the longest if there's none
+        self.literal = self.head or max(segments, key=len) or None
+        self.index = self.literal_index if self.literal else None
+
+        #: capture(line, text) checks text (the line, lowercased when
+        #: ignoring case) against the pattern and returns a tuple of what
+        #: each wildcard matched in line, or None
+        self.capture = _compile_wildcard(self.head, self.middle, self.tail)
+
+    def match(self, line):
+        return self._found(line, line)
+
+    def match_span(self, line, first, last):
+        """ Called when the master group found the indexed literal """
+        if self.head and first != 0:
+            return False
+
+        return self._found(line, line)
+
+    def _found(self, line, text):
+        captures = self.capture(line, text)
+
+        if captures is not None:
+            return self.successful_match(line, captures)
+
+        return False
+
+    def successful_match(self, line, captures):
+        """ Called when the matchable successfully matches """
+        match = WildcardMatch(self, line, captures)
+
+        if self.gag:
+            line.gag()
+
+        return self._matched(match)
+
+
+def _compile_wildcard(head, middle, tail):
+    """ Generate the function checking a line against a wildcard pattern,
+        with its literals and their lengths inlined
+    """
+
+    if tail is None:
+        return lambda line, text: () if text == head else None
+
+    source = ['def capture(line, text):']
+
+    if tail:
+        source.append('    if not text.endswith(%r):' % tail)
+        source.append('        return None')
+
+    if head:
+        source.append('    if not text.startswith(%r):' % head)
+        source.append('        return None')
+
+    source.append('    end = len(text) - %d' % len(tail))
+    source.append('    if end < %d:' % len(head))
+    source.append('        return None')
+
+    # the middle literals are found leftmost-first, like .*? would
+    start = '%d' % len(head)
+    captures = []
+
+    for i, segment in enumerate(middle):
+        source.append('    found%d = text.find(%r, %s, end)' % (i, segment,
+            start))
+        source.append('    if found%d == -1:' % i)
+        source.append('        return None')
+        captures.append('line[%s:found%d]' % (start, i))
+        start = 'found%d + %d' % (i, len(segment))
+
+    captures.append('line[%s:end]' % start)
+    source.append('    return (%s,)' % ', '.join(captures))
+
+    namespace = {}
+    exec(compile('\n'.join(source), '<wildcard>', 'exec'), namespace)
+
+    return namespace['capture']
+
+
+class CIWildcard(CIMatchable, Wildcard):
+    """ Case-insensitive wildcard matchable """
+
+    __slots__ = ()
+
+    literal_index = 'ci_literal'
+
+    def __init__(self, **kwargs):
+
+        kwargs['pattern'] = kwargs['pattern'].lower()
+
+        Wildcard.__init__(self, **kwargs)
+
+    def match(self, line):
+        return self._found(line, fold(line))
+
+    def match_span(self, line, first, last):
+        """ Called when the master group found the indexed literal """
+        if self.head and first != 0:
+            return False
+
+        return self._found(line, fold(line))
+
+
+class SequenceMatch(Match):
+    """ A successful match of a :class:`Sequence` across several lines """
+
+    __slots__ = ('lines', 'matchobjs')
+
+    def __init__(self, matchable, lines, matchobjs):
+        Match.__init__(self, matchable, lines[-1])
+
+        #: every line matched, one per step
+        self.lines = lines
+
+        #: re.MatchObject of each step
+        self.matchobjs = matchobjs
+
+    @property
+    def groups(self):
+        """ regex groups of all steps together as a tuple """
+        return sum((matchobj.groups() for matchobj in self.matchobjs), ())
+
+
+class Sequence(Matchable):
+    """ Matches a sequence of lines, each against its own regex
+
+        The matchable is advanced one line at a time, across buffers, and
+        never looks back at earlier lines. It only remembers the newest
+        partial match for each step, so it never holds more than one partial
+        match per step.
+    """
+
+    __slots__ = ('steps', 'max_gap', 'partials')
+
+    #: advanced by the master group on every line
+    index = 'sequence'
+
+    def __init__(self, **kwargs):
+
+        flags = 0
+
+        if kwargs.pop('ignorecase'):
+            flags = re.IGNORECASE
+
+        #: lines allowed between two steps. None for any number.
+        self.max_gap = kwargs.pop('max_gap', 0)
+
+        kwargs['pattern'] = [intern_regex(step, flags)
+            for step in kwargs['pattern']]
+
+        Matchable.__init__(self, **kwargs)
+
+        if not self.pattern:
+            raise MatchableCreationError('A sequence needs at least one line')
+
+        #: bound match methods of each step's regex
+        self.steps = [step.match for step in self.pattern]
+
+        #: partial matches by number of steps matched, as
+        #: [lines, matchobjs, gap]
+        self.partials = [None] * len(self.steps)
+
+    def match(self, line):
+        steps = self.steps
+        partials = self.partials
+        last = len(steps) - 1
+        complete = None
+
+        # furthest along first, so a line only advances each partial once
+        for step in range(last, 0, -1):
+            partial = partials[step]
+
+            if partial is None:
+                continue
+
+            found = steps[step](line)
+
+            if found:
+                partials[step] = None
+                advanced = [partial[0] + [line], partial[1] + [found], 0]
+
+                if step == last:
+                    complete = advanced
+                else:
+                    partials[step + 1] = advanced
+            elif self.max_gap is not None and partial[2] >= self.max_gap:
+                partials[step] = None
+            else:
+                partial[2] += 1
+
+        found = steps[0](line)
+
+        if found:
+            if last == 0:
+                complete = [[line], [found], 0]
+            else:
+                partials[1] = [[line], [found], 0]
+
+        if complete is not None:
+            return self.successful_match(complete[0], complete[1])
+
+        return False
+
+    def successful_match(self, lines, matchobjs):
+        """ Called when the last step matches """
+        self.reset()
+
+        match = SequenceMatch(self, lines, matchobjs)
+
+        if self.gag:
+            # earlier lines may be from a buffer already sent
+            for line in lines:
+                line.gag()
+
+        return self._matched(match)
+
+    def reset(self):
+        """ Forget all partial matches """
+        self.partials = [None] * len(self.steps)
+
+    def disable(self):
+        """ Disable the matchable, forgetting partial matches """
+        self.reset()
+        Matchable.disable(self)
+
+
+class Group(object):
+    """ Base matchable group """
+
+    def __init__(self, name, parent, app, enabled=True, priority=None,
+            exclusive=False, adaptive=False, post_output=None):
+        self.name = name
+        self.parent = weakref.ref(parent)
+        self.app = app
+
+        #: default priority of the group's matchables. Defaults to the
+        #: parent group's.
+        self.priority = parent.priority if priority is None else priority
+
+        #: stop matching a line once one of the group's matchables matched it
+        self.exclusive = exclusive
+
+        #: the order of the group's matchables doesn't matter, run the ones
+        #: that hit most often first
+        self.adaptive = adaptive
+
+        #: default for the group's matchables: run bound methods after the
+        #: output has been sent. Defaults to the parent group's.
+        self.post_output = parent.post_output if post_output is None \
+            else post_output
+
+        # enablement of the group and its ancestors, cached until the master
+        # group's generation changes
+        self._master = parent._master
+        self._generation = None
+        self._active = None
+
+        self._enabled = False
+        self.enabled = enabled
+
+        self.groups = {}
+        self.matchables = {}
+
+        if adaptive:
+            self._master()._adaptive.add(self)
+
+        if apps.valid(app) is False:
             raise AppNotFound("Unable to find app named '%s'" % app)
 
-        if self.__class__ in (TriggerMasterGroup, TriggerGroup):
-            klass = TriggerGroup
-        else:
-            klass = AliasGroup
+        apps.add_group(app, self)
+
+    def create(self,
+        name,
+        mtype,
+        pattern,
+        methods=[],
+        enabled=True,
+        ignorecase=True,
+        delay=None,
+        disable_on_match=False,
+        disable_on_prompt=False,
+        gag=False,
+        intercept=True,
+        priority=None,
+        batch=False,
+        max_gap=0,
+        post_output=None):
+        """ Create a trigger or alias (depending on the master group)
+
+            :param name: name of the matchable.
+            :type name: string
+            :param mtype: 'type' of matchable. Must be 'exact', 'substring',
+                'regex', 'startswith', 'endswith', 'wildcard' or 'sequence'.
+            :type mtype: string
+            :param pattern: pattern to match against. For sequences, a list
+                of regexes for consecutive lines.
+            :type pattern: string
+            :param methods: (optional) methods to bind to the matchable.
+            :type methods: list
+            :param enabled: (optional) is the matchable enabled.
+            :type enabled: bool
+            :param ignorecase: (optional) is the matchable case-insensitive.
+            :type ignorecase: bool
+            :param delay: (optional) how many seconds to delay execution of
+                bound methods after a successful match.
+            :type delay: int or None
+            :param disable_on_match: (optional) disable matchable after a
+                successful match.
+            :type disable_on_match: bool
+            :param disable_on_prompt: (optional) disable matchable after a
+                successful match on the following prompt.
+            :type disable_on_prompt: bool
+            :param gag: (optional) gag the line on a match.
+            :type gag: bool
+            :param intercept: (optional) -aliases only- Intercept the output of
+                the command being sent.
+            :type intercept: bool
+            :param priority: (optional) higher priority matchables are run
+                first. Defaults to the group's priority.
+            :type priority: int
+            :param batch: (optional) -regex only- match the regex against
+                whole buffers at once, see :meth:`MasterGroup.scan_buffer`.
+            :type batch: bool
+            :param max_gap: (optional) -sequence only- lines allowed between
+                two lines of the sequence. None for any number.
+            :type max_gap: int or None
+            :param post_output: (optional) run bound methods in a later
+                reactor turn, after the output has been sent. Defaults to the
+                group's. See :meth:`MasterGroup.post`.
+            :type post_output: bool
+        """
+
+        kwargs = {
+            'name': name,
+            'pattern': pattern,
+            'methods': methods,
+            'enabled': enabled,
+            'delay': delay,
+            'disable_on_match': disable_on_match,
+            'disable_on_prompt': disable_on_prompt,
+            'gag': gag,
+            'intercept': intercept,
+            'priority': priority,
+            'post_output': post_output,
+            'parent': self,
+            'group_type': self.group_type
+        }
+
+        if mtype == 'exact':
+            m = CIExact(**kwargs) if ignorecase is False \
+                else Exact(**kwargs)
+        elif mtype == 'substring':
+            m = CISubstring(**kwargs) if ignorecase is False  \
+                else Substring(**kwargs)
+        elif mtype == 'regex':
+            kwargs['ignorecase'] = ignorecase
+            kwargs['batch'] = batch
+            m = Regex(**kwargs)
+        elif mtype == 'startswith':
+            m = CIStartswith(**kwargs) if ignorecase is False \
+                else Startswith(**kwargs)
+        elif mtype == 'endswith':
+            m = CIEndswith(**kwargs) if ignorecase is False \
+                else Endswith(**kwargs)
+        elif mtype == 'wildcard':
+            m = CIWildcard(**kwargs) if ignorecase is False \
+                else Wildcard(**kwargs)
+        elif mtype == 'sequence':
+            kwargs['ignorecase'] = ignorecase
+            kwargs['max_gap'] = max_gap
+            m = Sequence(**kwargs)
+        else:
+            raise InvalidMatchableType('Unsupported matchable type: %s' % mtype)
+
+        if mtype in ('regex', 'sequence'):
+            patterns = m.pattern if mtype == 'sequence' else [m.pattern]
+
+            for regex in patterns:
+                if nested_quantifier(regex):
+                    _log.msg("Warning: %s '%s' has nested quantifiers and may "
+                        "backtrack catastrophically: %r" % (self.group_type,
+                        _path(m), regex.pattern))
+
+        self.matchables[name] = m
+
+        if self.adaptive:
+            self._master()._seed(m)
+
+        if enabled:
+            self._enable(m)
+
+        return m
+
+    @property
+    def enabled(self):
+        """ Is the group enabled """
+        return self._enabled
+
+    @enabled.setter
+    def enabled(self, value):
+        changed = bool(value) != bool(self._enabled)
+        self._enabled = value
+
+        # enabling an enabled group changes nothing anything is cached by
+        if changed:
+            self._master().generation += 1
+
+    @property
+    def active(self):
+        """ Is the group and every group above it enabled """
+        master = self._master()
+
+        if self._generation != master.generation:
+            parent = self.parent()
+            self._active = bool(self._enabled) and \
+                (parent is master or parent.active)
+            self._generation = master.generation
+
+        return self._active
+
+    def disable(self, name=None):
+        """ Disable a group or matchable
+
+            If called without a parameter, will disable the group being called.
+            If name is provided, it will do a :meth:`get`
+            lookup and call :meth:`disable` on that object.
+
+            Disabling a group doesn't touch its matchables or child groups,
+            they are skipped while the group is disabled.
+
+            :param name: (optional) matchable query string
+        """
+
+        if name is None:
+            self.enabled = False
+            return True
+        else:
+            target = self.get(name)
+
+            if target:
+                target.disable()
+                return True
+
+    def cancel_delayed(self):
+        """ Cancel the pending delayed calls of the group's matchables and
+            those of all its child groups
+
+            :returns: number of calls cancelled
+        """
+
+        cancelled = timers.cancel_tag(self)
+
+        for child_group in self.groups.values():
+            cancelled += child_group.cancel_delayed()
+
+        return cancelled
+
+    def destroy(self):
+        """ Destroys (deletes) the group """
+        for matchable in self.matchables.values():
+            matchable.destroy()
+
+        for child_group in self.groups.values():
+            child_group.destroy()
+
+        self.parent()._remove_group(self.name)
+
+    def debug(self, indent=0):
+        """ Print out a visual representation of all child matchables and groups
+
+            :param indent: (optional) number of tabs to ident by
+            :type indent: integer
+        """
+
+        for name, g in self.groups.iteritems():
+            print("%s<%s [%s]>" % ('\t' * indent, name, '+' if g.enabled else ' '))
+            g.debug(indent+1)
+
+        for name, m in self.matchables.iteritems():
+            print("%s-%s [%s]" % ('\t' * indent, name, '+' if m.enabled else ' '))
+
+
+    def enable(self, name=None):
+        """ Enable a group or matchable
+
+            If called without a parameter, will enable the group being called.
+            If name is provided, it will do a :meth:`get`
+            lookup and call :meth:`enable` on that object.
+
+            :param name: (optional) matchable query string
+        """
+
+        if name is None:
+            self.enabled = True
+            return True
+        else:
+            target = self.get(name)
+
+            if target:
+                target.enable()
+                return True
+
+
+    def create_group(self, name, app=None, enabled=True, priority=None,
+            exclusive=False, adaptive=False, post_output=None):
+        """ Creates a child group
+
+            :param name: name of group
+            :param app: name of app the group belongs to. If not set will be
+                the group's parent's app.
+            :param enabled: (optional) if group is enabled
+            :type enabled: bool
+            :param priority: (optional) default priority of the group's
+                matchables. If not set will be the parent group's.
+            :type priority: int
+            :param exclusive: (optional) stop matching a line as soon as one
+                of the group's matchables matches it.
+            :type exclusive: bool
+            :param adaptive: (optional) the group's matchables can run in any
+                order. Sage runs the ones that hit most often first and
+                remembers their hit rates between sessions.
+            :type adaptive: bool
+            :param post_output: (optional) default for the group's
+                matchables: run bound methods after the output has been sent.
+                If not set will be the parent group's.
+            :type post_output: bool
+        """
+        if name in self.groups:
+            return self.groups[name]
+
+        if app is None:
+            if self.app is None:
+                raise OrphanedMatchableGroupError(
+                "Top-level group '%s' must have an app declared in "
+                "create_group()" % name)
+            app = self.app
+        elif apps.valid(app) is False:
+            raise AppNotFound("Unable to find app named '%s'" % app)
+
+        if self.__class__ in (TriggerMasterGroup, TriggerGroup):
+            klass = TriggerGroup
+        else:
+            klass = AliasGroup
+
+        self.groups[name] = klass(name, self, app, enabled, priority,
+            exclusive, adaptive, post_output)
+        return self.groups[name]
+
+    def remove_group(self, name):
+        """ Removes a child group by name
+
+            :param name: name of group
+        """
+
+        if name in self.groups:
+            self.groups[name].destroy()
+            return True
+
+        return False
+
+    def _remove_group(self, name):
+        self._master()._adaptive.discard(self.groups[name])
+        apps.remove_group(self.groups[name].app, self.groups[name])
+        if name in self.groups:
+            del(self.groups[name])
+
+    def remove(self, name):
+        """ Remove a matchable by name
+
+            :param name: name of matchable
+        """
+
+        if name in self.matchables:
+            instance = self.matchables[name]
+            self._remove_child(instance)
+            return True
+
+        return False
+
+    def get(self, name):
+        """ Returns a group or matchable from a matchable query string
+
+        :param name: matchable query string
+        """
+        if '/' in name:
+            return self._parse_name(name)
+        else:
+            if name in self.matchables:
+                return self.matchables[name]
+            elif name in self.groups:
+                return self.groups[name]
+            return None
+
+    def get_group(self, name):
+        """ Returns a group from a matchable query string
+
+        :param name: matchable query string
+        """
+        if '/' in name:
+            parts = name.split('/')
+            group = self
+            for segment in parts:
+                if segment in group.groups:
+                    group = group.groups[segment]
+                    if group is None:
+                        return None
+                else:
+                    return None
+
+            return group
+        else:
+            if name in self.groups:
+                return self.groups[name]
+            return None
+
+    def names(self):
+        """ Returns names of all matchables """
+        return self.matchables.keys()
+
+    def _enable(self, instance):
+        self.parent()._enable(instance)
+
+    def _disable(self, instance):
+        self.parent()._disable(instance)
+
+    def _remove_child(self, instance):
+        if instance.name in self.matchables:
+            del(self.matchables[instance.name])
+
+        # removal is deferred while matching, make sure it's skipped until then
+        instance.enabled = False
+        self._remove(instance)
+
+    def _remove(self, instance):
+        self.parent()._remove(instance)
+
+    def _parse_name(self, name):
+        parts = name.split('/')
+        head = parts[:-1]
+        tail = parts[-1]
+
+        group = self
+
+        for segment in head:
+            if segment in group.groups:
+                group = group.groups[segment]
+
+        if tail in group.groups:
+            return group.groups[tail]
+        elif tail in group.matchables:
+            return group.matchables[tail]
+        else:
+            return None
+
+    def _decorator(self, **kwargs):
+        name = kwargs.pop('name', None)
+        mtype = kwargs.pop('type', None)
+        mtype = 'exact' if mtype is None else mtype
+        pattern = kwargs.pop('pattern', None)
+        enabled = kwargs.pop('enabled', True)
+        ignorecase = kwargs.pop('ignorecase', True)
+        delay = kwargs.pop('delay', None)
+        param = kwargs.pop('param', None)
+        disable_on_prompt = kwargs.pop('disable_on_prompt', False)
+        disable_on_match = kwargs.pop('disable_on_match', False)
+        gag = kwargs.pop('gag', False)
+        intercept = kwargs.pop('intercept', True)
+        priority = kwargs.pop('priority', None)
+        batch = kwargs.pop('batch', False)
+        max_gap = kwargs.pop('max_gap', 0)
+        post_output = kwargs.pop('post_output', None)
+
+        def dec(func):
+
+            if name is None:
+                mname = func.__name__
+
+                # matchable by this name already exists, increment a new one
+                if mname in self.matchables:
+                    if hasattr(func, '_matchable_counter'):
+                        func._matchable_counter += 1
+                    else:
+                        func._matchable_counter = 2
+
+                    mname = mname + str(func._matchable_counter)
+            else:
+                mname = name
+
+            if pattern is None:
+                # we are appending to an existing matchable?
+                if name in self:
+                    m = self[name]
+                    m.bind(func, param)
+                    return func
+                else:
+                    raise MatchableCreationError('No pattern defined for %s' % mname)
+
+            m = self.create(mname, mtype, pattern,
+                enabled=enabled, ignorecase=ignorecase, delay=delay,
+                disable_on_match=disable_on_match, disable_on_prompt=disable_on_prompt, gag=gag,
+                intercept=intercept, priority=priority, batch=batch,
+                max_gap=max_gap, post_output=post_output)
+            m.bind(func, param)
+
+            return func
+
+        return dec
+
+    def exact(self, *args, **kwargs):
+        if len(args) == 1:
+            kwargs['pattern'] = args[0]
+        kwargs['type'] = 'exact'
+        return self._decorator(**kwargs)
+
+    def startswith(self, *args, **kwargs):
+        if len(args) == 1:
+            kwargs['pattern'] = args[0]
+        kwargs['type'] = 'startswith'
+        return self._decorator(**kwargs)
+
+    def endswith(self, *args, **kwargs):
+        if len(args) == 1:
+            kwargs['pattern'] = args[0]
+        kwargs['type'] = 'endswith'
+        return self._decorator(**kwargs)
+
+    def substring(self, *args, **kwargs):
+        if len(args) == 1:
+            kwargs['pattern'] = args[0]
+        kwargs['type'] = 'substring'
+        return self._decorator(**kwargs)
+
+    def regex(self, *args, **kwargs):
+        if len(args) == 1:
+            kwargs['pattern'] = args[0]
+        kwargs['type'] = 'regex'
+        return self._decorator(**kwargs)
+
+    def wildcard(self, *args, **kwargs):
+        if len(args) == 1:
+            kwargs['pattern'] = args[0]
+        kwargs['type'] = 'wildcard'
+        return self._decorator(**kwargs)
+
+    def sequence(self, *args, **kwargs):
+        if len(args) == 1:
+            kwargs['pattern'] = args[0]
+        kwargs['type'] = 'sequence'
+        return self._decorator(**kwargs)
+
+    def __repr__(self):
+        estring = 'enabled' if self.enabled else 'disabled'
+        return "%s '%s' (%s groups, %s objects) [%s]" % (self.__class__,
+            self.name, len(self.groups), len(self.matchables), estring)
+
+    def __getitem__(self, *args, **kwargs):
+        return self.matchables.__getitem__(*args, **kwargs)
+
+    def __call__(self, name):
+        return self.get(name)
+
+
+class TriggerGroup(Group):
+
+    group_type = 'trigger'
+
+    #: deprecated
+    def trigger(self, **kwargs):
+        return self._decorator(**kwargs)
+
+
+class AliasGroup(Group):
+
+    group_type = 'alias'
+
+    #: deprecated
+    def alias(self, **kwargs):
+        return self._decorator(**kwargs)
+
+
+class MasterGroup(Group):
+
+    #: lines between reordering adaptive groups
+    reorder_interval = 500
+
+    #: hit rates of adaptive matchables are multiplied by this on every
+    #: reorder
+    decay = 0.5
+
+    #: file in an app's directory hit rates are kept in between sessions
+    hits_file = '.hits.json'
+
+    #: literals it takes for the literal scan to use an Aho-Corasick
+    #: automaton rather than :func:`find_literals`, see
+    #: ``benchmarks/bench_literals.py``
+    automaton_size = 64
+
+    #: seconds of post-output work run per reactor turn, see :meth:`post`
+    post_budget = 0.005
+
+    def __init__(self):
+
+        self.name = 'master'
+        self.parent = self
+        self.app = None
+        self.priority = 0
+        self.exclusive = False
+        self.post_output = False
+        self.groups = {}
+        self.matchables = {}
+
+        self._master = weakref.ref(self)
+
+        #: bumped whenever a group is enabled or disabled
+        self.generation = 0
+
+        #: bumped whenever a matchable is enabled, disabled or removed
+        self.version = 0
+
+        #: line -> matches memo, see :meth:`memoize`
+        self.cache = None
+        self._cache_state = None
+
+        #: adaptive groups
+        self._adaptive = set()
+
+        # app -> persisted hit rates by matchable path
+        self._seeds = {}
+        self._reorder_pending = False
+
+        #: :class:`Budget` regexes are held to, see :meth:`guard`
+        self.budget = None
+
+        #: (method, args) waiting for the output to be sent, see :meth:`post`
+        self.pending = deque()
+        self._drain_call = None
+
+        #: scan with a generated function, see :meth:`compile`
+        self.compiled = False
+        self._matcher = None
+        self._matcher_version = None
+
+        #: matchables that are enabled themselves, whatever their groups are
+        self._armed = set()
+
+        self._to_add = set()
+        self._to_remove = set()
+
+        # the sets of matchables in the indexes below are split up by group,
+        # as group -> set, so lines pass over those of inactive groups whole
+
+        #: exact patterns -> set of matchables
+        self._exact = {}
+
+        #: lowercased exact patterns -> set of case-insensitive matchables
+        self._ci_exact = {}
+
+        #: substring, startswith and endswith patterns -> set of matchables
+        self._literal = {}
+
+        #: lowercased literal patterns -> set of case-insensitive matchables
+        self._ci_literal = {}
+
+        #: first words of startswith patterns spanning more than one word
+        #: -> set of matchables
+        self._word = {}
+
+        #: lowercased first words -> set of case-insensitive matchables
+        self._ci_word = {}
+
+        #: literals required by regexes -> set of regex matchables
+        self._prefilter = {}
+
+        #: lowercased literals required by case-insensitive regexes
+        self._ci_prefilter = {}
+
+        #: regexes matched a buffer at a time -> set of themselves
+        self._batch = {}
+
+        #: case-insensitive regexes matched a buffer at a time
+        self._ci_batch = {}
+
+        #: sequences -> set of themselves
+        self._sequences = {}
+
+        #: compiled regex -> set of enabled regex matchables using it
+        self._owners = {}
+
+        # enabled sequences in priority order
+        self._sequence_order = None
+
+        self._indexes = {
+            'exact': self._exact,
+            'ci_exact': self._ci_exact,
+            'literal': self._literal,
+            'ci_literal': self._ci_literal,
+            'word': self._word,
+            'ci_word': self._ci_word,
+            'prefilter': self._prefilter,
+            'ci_prefilter': self._ci_prefilter,
+            'batch': self._batch,
+            'ci_batch': self._ci_batch,
+            'sequence': self._sequences
+        }
+
+        #: compiled literal automatons, or tuples of the literals while there
+        #: are fewer than :attr:`automaton_size`, rebuilt when their patterns
+        #: change. Literal matchables and regex prefilters share one scan.
+        self._automatons = {
+            'literal': None,
+            'ci_literal': None
+        }
+
+        #: batched regexes merged into (alternation, matchables) chunks,
+        #: rebuilt when batched regexes are added or removed
+        self._batches = {
+            'batch': None,
+            'ci_batch': None
+        }
+
+        # version the last buffer was scanned at
+        self._batch_version = None
+
+        #: lines matched against
+        self.lines = 0
+
+        #: group -> (order, matchable) of the group's matchables that have to
+        #: be run against every line, kept sorted
+        self._runs = {}
+
+        #: runs of the active groups merged, rebuilt when what's enabled
+        #: changes, see :meth:`_active_scan`
+        self._scan = []
+        self._scan_groups = set()
+        self._scan_state = None
+
+        self.in_loop = False
+
+    @property
+    def enabled(self):
+        """ Set of matchables that are enabled along with all their groups """
+        return set(instance for instance in self._armed if instance.active)
+
+    @property
+    def active(self):
+        return True
+
+    def profile(self, enabled=True):
+        """ Turn profiling of the master group's matchables on or off
+
+            See :mod:`sage.profiling`. Counters are kept when profiling is
+            turned off.
+
+            :param enabled: (optional) profile or not
+            :type enabled: bool
+        """
+
+        if enabled:
+            profiler.enable(self.group_type)
+        else:
+            profiler.disable(self.group_type)
+
+    def stats(self, by='matchable', sort='match_time', top=None):
+        """ Report on the profiled matchables
+
+            :param by: (optional) roll up by 'matchable', 'group' or 'app'
+            :param sort: (optional) 'evaluations', 'hits', 'match_time',
+                'callback_time' or 'time' (match and callback time combined)
+            :param top: (optional) number of rows to report
+            :returns: :class:`sage.profiling.Report`
+        """
+        return profiler.report(self.group_type, by=by, sort=sort, top=top)
+
+    def reset_stats(self):
+        """ Clear all profiling counters of the master group's matchables """
+        profiler.reset(self.group_type)
+
+    def memoize(self, size=1024):
+        """ Turn the line memo cache on or off
+
+            While on, the matchables a line matched (and what they captured)
+            are remembered by the line's text. When the same line comes again
+            the matches are replayed without evaluating any patterns. The
+            cache is emptied whenever a matchable or group is enabled,
+            disabled or removed.
+
+            :param size: (optional) number of lines to remember. 0 or None
+                turns the cache off.
+            :type size: int
+        """
+
+        if size:
+            self.cache = LRUCache(size)
+        else:
+            self.cache = None
+
+        self._cache_state = None
+
+    def guard(self, seconds=0.05, disable=False):
+        """ Time every regex and report the ones that are too slow
+
+            A regex taking longer than the budget on a line is logged along
+            with the line and counted in ``budget.overruns``. Since a regex
+            can't be interrupted, this finds bad regexes rather than stopping
+            them. Turns off the compiled matcher while on.
+
+            :param seconds: (optional) seconds a regex may take on a line.
+                None turns the guard off.
+            :type seconds: float
+            :param disable: (optional) disable regexes going over budget
+            :type disable: bool
+        """
+
+        if seconds is None:
+            self.budget = None
+            _budgets.pop(self.group_type, None)
+        else:
+            self.budget = Budget(seconds, disable)
+            _budgets[self.group_type] = self.budget
+
+    def post(self, method, *args):
+        """ Call a method once the output has been sent
+
+            Bound methods of ``post_output`` matchables are queued here
+            instead of being called while the line is matched. Gagging and
+            rewriting lines still happen while matching, so only the work
+            that doesn't change the output is put off.
+
+            :param method: method to call
+            :param args: arguments to call it with
+        """
+        self.pending.append((method, args))
+
+    def run_pending(self):
+        """ Start calling the queued methods in the next reactor turn
+
+            Called once the output has been sent. Methods are called until
+            :attr:`post_budget` is used up, the rest are left for the turns
+            after so the reactor gets to handle other data in between.
+        """
+
+        if self.pending and self._drain_call is None:
+            self._drain_call = reactor.callLater(0, self._drain)
+
+    def _drain(self):
+        self._drain_call = None
+
+        pending = self.pending
+        deadline = clock() + self.post_budget
+
+        while pending:
+            method, args = pending.popleft()
+
+            try:
+                method(*args)
+            except Exception:
+                _log.err()
+
+            if clock() > deadline:
+                break
+
+        self.run_pending()
+
+    def compile(self, enabled=True):
+        """ Turn the compiled matcher on or off
+
+            Matchables no index can find are normally run one by one against
+            every line. When compiled, Sage instead generates a single
+            function that runs all of them in sequence with everything it
+            needs bound as locals. The function is rebuilt whenever a
+            matchable is enabled, disabled or removed. Profiling always uses
+            the regular loop.
+
+            :param enabled: (optional) compile or not
+            :type enabled: bool
+        """
+
+        self.compiled = enabled
+        self._matcher = None
+        self._matcher_version = None
+
+    def cache_stats(self):
+        """ Hits, misses and hit ratio of the line memo cache
+
+            :returns: dict, or None if the cache is off
+        """
+
+        if self.cache is None:
+            return None
+
+        return {
+            'hits': self.cache.hits,
+            'misses': self.cache.misses,
+            'ratio': self.cache.ratio,
+            'size': len(self.cache)
+        }
+
+    def match(self, line, batched=None):
+        """ Run all enabled matchables against a line
+
+            Exact matchables are found with a single lookup, startswith
+            matchables spanning whole words by the line's first word and
+            literal matchables with a single pass over the line. Everything
+            else is run against the line in turn, skipping disabled groups.
+            Matchables run in priority order, see :meth:`reorder` for
+            adaptive groups. With :meth:`memoize` on, lines seen before skip
+            all of that.
+
+            :param line: line to match against
+            :param batched: (optional) batched regexes :meth:`scan_buffer`
+                found the line might match
+            :returns: list of :class:`Match` for each successful match
+        """
+
+        if not self.in_loop:
+            # defer changes to what's enabled until the line is done
+            self.in_loop = True
+            try:
+                return self.match(line, batched)
+            finally:
+                self.in_loop = False
+                self.flush_set()
+
+        self.lines += 1
+
+        if self._adaptive:
+            if self._reorder_pending:
+                self.reorder(decay=False)
+            elif not self.lines % self.reorder_interval:
+                self.reorder()
+
+        matched = self._memo_match(line, batched)
+
+        if self._sequences:
+            self._advance(line, matched)
+
+        if self._adaptive:
+            for match in matched:
+                match.matchable.rate += 1
+
+        return matched
+
+    def _memo_match(self, line, batched):
+        cache = self.cache
+
+        if cache is not None:
+            state = (self.version, self.generation)
+
+            if state != self._cache_state:
+                cache.clear()
+                self._cache_state = state
+
+            replay = cache.get(str(line))
+
+            if replay is not None:
+                return self._replay(replay, line)
+
+            matched = self._evaluate(line, batched)
+
+            # results are only reusable if matching didn't change what's
+            # enabled (disable_on_match and the like)
+            if state == (self.version, self.generation):
+                cache.set(str(line), tuple((match.matchable,
+                    match.replay_args()) for match in matched))
+
+            return matched
+
+        return self._evaluate(line, batched)
+
+    def _evaluate(self, line, batched=None):
+        # matchables the indexes turned up, as (order, instance, span)
+        candidates = []
+
+        if self._batch or self._ci_batch:
+            # what's batched changed since the buffer was scanned
+            if batched is None or self._batch_version != self.version:
+                batched = self._scan_lines([line])[0]
+
+            candidates.extend((i.order, i, None) for i in batched)
+
+        hits = self._exact.get(line)
+        if hits:
+            self._gather(hits, candidates)
+
+        folded = None
+
+        if self._ci_exact:
+            folded = fold(line)
+            hits = self._ci_exact.get(folded)
+            if hits:
+                self._gather(hits, candidates)
+
+        if self._word:
+            hits = self._word.get(line.partition(' ')[0])
+            if hits:
+                self._gather(hits, candidates)
+
+        if self._ci_word:
+            if folded is None:
+                folded = fold(line)
+            hits = self._ci_word.get(folded.partition(' ')[0])
+            if hits:
+                self._gather(hits, candidates)
+
+        if self._literal or self._prefilter:
+            self._scan_literals('literal', line, candidates)
+
+        if self._ci_literal or self._ci_prefilter:
+            if folded is None:
+                folded = fold(line)
+            self._scan_literals('ci_literal', folded, candidates)
+
+        matched = []
+
+        if not candidates:
+            if self.compiled and self.budget is None and \
+                    self.group_type not in profiler.types:
+                if self._matcher_version != self.version:
+                    self._matcher = self._build_matcher()
+                    self._matcher_version = self.version
+
+                # groups active as the line starts, like the loop's
+                self._active_scan()
+                self._matcher(line, matched, self._scan_groups)
+                return matched
+
+            self._run(line, matched)
+            return matched
+
+        candidates.sort()
+        self._run(line, matched, candidates)
+
+        return matched
+
+    def reorder(self, decay=True):
+        """ Reorder the matchables of adaptive groups by hit rate
+
+            Done every :attr:`reorder_interval` lines. Within an adaptive
+            group, matchables of the same priority trade places so the ones
+            hitting most often run first. Where the group's matchables stand
+            relative to other groups doesn't change.
+
+            :param decay: (optional) multiply hit rates by :attr:`decay`
+                afterwards
+            :type decay: bool
+        """
+
+        self._reorder_pending = False
+        changed = False
+
+        for group in self._adaptive:
+            tiers = {}
+
+            for instance in group.matchables.values():
+                tiers.setdefault(instance.priority, []).append(instance)
 
-        self.groups[name] = klass(name, self, app, enabled)
-        return self.groups[name]
+            for instances in tiers.values():
+                slots = sorted(instance.order for instance in instances)
+                ranked = sorted(instances,
+                    key=lambda instance: (-instance.rate, instance.order))
 
-    def remove_group(self, name):
-        """ Removes a child group by name
+                for instance, order in zip(ranked, slots):
+                    if instance.order != order:
+                        instance.order = order
+                        changed = True
 
-            :param name: name of group
+                if decay:
+                    for instance in instances:
+                        instance.rate *= self.decay
+
+        if changed:
+            for group, run in self._runs.items():
+                self._runs[group] = sorted((instance.order, instance)
+                    for _, instance in run)
+            self._sequence_order = None
+            self.version += 1
+
+    def save_hits(self, app):
+        """ Write the hit rates of an app's adaptive matchables to the app's
+            directory, to start from next session
+
+            :param app: name of the app
         """
 
-        if name in self.groups:
-            self.groups[name].destroy()
-            return True
+        filename = self._hits_path(app)
+        self._seeds.pop(app, None)
 
-        return False
+        if filename is None:
+            return
 
-    def _remove_group(self, name):
-        apps.remove_group(self.groups[name].app, self.groups[name])
-        if name in self.groups:
-            del(self.groups[name])
+        rates = {}
 
-    def remove(self, name):
-        """ Remove a matchable by name
+        for group in apps.groups.get(app, ()):
+            if group.adaptive and group._master() is self:
+                for instance in group.matchables.values():
+                    if instance.rate:
+                        rates[_path(instance)] = instance.rate
 
-            :param name: name of matchable
-        """
+        data = self._load_hits(filename)
 
-        if name in self.matchables:
-            instance = self.matchables[name]
-            self._remove_child(instance)
-            return True
+        if not rates and self.group_type not in data:
+            return
 
-        return False
+        data[self.group_type] = rates
 
-    def get(self, name):
-        """ Returns a group or matchable from a matchable query string
+        try:
+            with open(filename, 'w') as f:
+                json.dump(data, f, indent=2, sort_keys=True)
+        except (IOError, OSError):
+            _log.err()
 
-        :param name: matchable query string
-        """
-        if '/' in name:
-            return self._parse_name(name)
-        else:
-            if name in self.matchables:
-                return self.matchables[name]
-            elif name in self.groups:
-                return self.groups[name]
+    def _hits_path(self, app):
+        meta = apps.meta.get(app)
+
+        if meta is None or getattr(meta, 'path', None) is None:
             return None
 
-    def get_group(self, name):
-        """ Returns a group from a matchable query string
+        return os.path.join(meta.path, self.hits_file)
 
-        :param name: matchable query string
-        """
-        if '/' in name:
-            parts = name.split('/')
-            group = self
-            for segment in parts:
-                if segment in group.groups:
-                    group = group.groups[segment]
-                    if group is None:
-                        return None
-                else:
-                    return None
+    def _load_hits(self, filename):
+        if filename is None or not os.path.isfile(filename):
+            return {}
 
-            return group
-        else:
-            if name in self.groups:
-                return self.groups[name]
-            return None
+        try:
+            with open(filename) as f:
+                return json_str_load(f)
+        except (ValueError, IOError, OSError):
+            _log.err()
+            return {}
 
-    def names(self):
-        """ Returns names of all matchables """
-        return self.matchables.keys()
+    def _seed(self, instance):
+        """ Start a new adaptive matchable off with its saved hit rate """
+        app = instance.parent().app
 
-    def _enable(self, instance):
-        if self.enabled:
-            self.parent()._enable(instance)
+        if app not in self._seeds:
+            data = self._load_hits(self._hits_path(app))
+            self._seeds[app] = data.get(self.group_type, {})
 
-    def _disable(self, instance):
-        self.parent()._disable(instance)
+        rate = self._seeds[app].get(_path(instance))
 
-    def _remove_child(self, instance):
-        if instance.name in self.matchables:
-            del(self.matchables[instance.name])
+        if rate:
+            instance.rate = rate
+            self._reorder_pending = True
 
-        self._remove(instance)
+    def _advance(self, line, matched):
+        """ Move every sequence along by a line """
 
-    def _remove(self, instance):
-        self.parent()._remove(instance)
+        if self._sequence_order is None:
+            self._sequence_order = sorted(self._sequences,
+                key=lambda instance: instance.order)
 
-    def _parse_name(self, name):
-        parts = name.split('/')
-        head = parts[:-1]
-        tail = parts[-1]
+        for instance in self._sequence_order:
+            if instance.enabled and instance.parent().active:
+                match = instance.match(line)
+                if match:
+                    matched.append(match)
 
-        group = self
+    def scan_buffer(self, lines):
+        """ Find the lines batched regexes might match
 
-        for segment in head:
-            if segment in group.groups:
-                group = group.groups[segment]
+            All enabled regexes created with ``batch=True`` are merged into
+            a few alternations that run over the lines joined together, so
+            the whole buffer takes a handful of scans in C rather than a
+            regex call per line and regex. Pass the result for each line to
+            :meth:`match`, which confirms the candidates with the regexes
+            themselves.
 
-        if tail in group.groups:
-            return group.groups[tail]
-        elif tail in group.matchables:
-            return group.matchables[tail]
-        else:
-            return None
+            :param lines: lines of the buffer
+            :returns: list with a set of candidate matchables for each line,
+                or None for each line if there are no batched regexes
+        """
 
-    def _decorator(self, **kwargs):
-        name = kwargs.pop('name', None)
-        mtype = kwargs.pop('type', None)
-        mtype = 'exact' if mtype is None else mtype
-        pattern = kwargs.pop('pattern', None)
-        enabled = kwargs.pop('enabled', True)
-        ignorecase = kwargs.pop('ignorecase', True)
-        delay = kwargs.pop('delay', None)
-        param = kwargs.pop('param', None)
-        disable_on_prompt = kwargs.pop('disable_on_prompt', False)
-        disable_on_match = kwargs.pop('disable_on_match', False)
-        gag = kwargs.pop('gag', False)
-        intercept = kwargs.pop('intercept', True)
+        if not lines or (not self._batch and not self._ci_batch):
+            return [None] * len(lines)
 
-        def dec(func):
+        # lines of the buffer rescan on their own once this is out of date
+        self._batch_version = self.version
 
-            if name is None:
-                mname = func.__name__
+        return self._scan_lines(lines)
 
-                # matchable by this name already exists, increment a new one
-                if mname in self.matchables:
-                    if hasattr(func, '_matchable_counter'):
-                        func._matchable_counter += 1
+    def _scan_lines(self, lines):
+        found = [set() for _ in lines]
+
+        text = '\n'.join(lines)
+
+        # offsets each line starts at in text
+        starts = []
+        offset = 0
+        for line in lines:
+            starts.append(offset)
+            offset += len(line) + 1
+
+        for name in ('batch', 'ci_batch'):
+            if not self._indexes[name]:
+                continue
+
+            if self._batches[name] is None:
+                self._batches[name] = self._build_batches(name)
+
+            for regex, members in self._batches[name]:
+                for match in regex.finditer(text):
+                    first = bisect.bisect_right(starts, match.start()) - 1
+                    last = bisect.bisect_right(starts,
+                        max(match.end() - 1, match.start())) - 1
+
+                    if first == last:
+                        # the alternatives before this one didn't match the
+                        # line, the ones after it still might
+                        hit = int(match.lastgroup[1:])
+                        found[first].update(members[hit:])
                     else:
-                        func._matchable_counter = 2
+                        # matched across lines, check them all on their own
+                        for index in range(first, last + 1):
+                            found[index].update(members)
 
-                    mname = mname + str(func._matchable_counter)
-            else:
-                mname = name
+        return found
 
-            if pattern is None:
-                # we are appending to an existing matchable?
-                if name in self:
-                    m = self[name]
-                    m.bind(func, param)
-                    return func
-                else:
-                    raise MatchableCreationError('No pattern defined for %s' % mname)
+    def _build_batches(self, name):
+        """ Merge batched regexes into as few alternations as the limit on
+            groups allows
+        """
 
-            m = self.create(mname, mtype, pattern,
-                enabled=enabled, ignorecase=ignorecase, delay=delay,
-                disable_on_match=disable_on_match, disable_on_prompt=disable_on_prompt, gag=gag,
-                intercept=intercept)
-            m.bind(func, param)
+        flags = re.MULTILINE
 
-            return func
+        if name == 'ci_batch':
+            flags |= re.IGNORECASE
 
-        return dec
+        batches = []
+        parts = []
+        members = []
+        groups = 0
 
-    def exact(self, *args, **kwargs):
-        if len(args) == 1:
-            kwargs['pattern'] = args[0]
-        kwargs['type'] = 'exact'
-        return self._decorator(**kwargs)
+        for instance in sorted(self._indexes[name],
+                key=lambda instance: instance.order):
 
-    def startswith(self, *args, **kwargs):
-        if len(args) == 1:
-            kwargs['pattern'] = args[0]
-        kwargs['type'] = 'startswith'
-        return self._decorator(**kwargs)
+            needed = instance.pattern.groups + 1
 
-    def endswith(self, *args, **kwargs):
-        if len(args) == 1:
-            kwargs['pattern'] = args[0]
-        kwargs['type'] = 'endswith'
-        return self._decorator(**kwargs)
+            if parts and groups + needed > 99:
+                batches.append((re.compile('|'.join(parts), flags), members))
+                parts = []
+                members = []
+                groups = 0
 
-    def substring(self, *args, **kwargs):
-        if len(args) == 1:
-            kwargs['pattern'] = args[0]
-        kwargs['type'] = 'substring'
-        return self._decorator(**kwargs)
+            parts.append('^(?P<b%d>(?:%s))' % (len(members),
+                instance.pattern.pattern))
+            members.append(instance)
+            groups += needed
 
-    def regex(self, *args, **kwargs):
-        if len(args) == 1:
-            kwargs['pattern'] = args[0]
-        kwargs['type'] = 'regex'
-        return self._decorator(**kwargs)
+        if parts:
+            batches.append((re.compile('|'.join(parts), flags), members))
 
-    def __repr__(self):
-        estring = 'enabled' if self.enabled else 'disabled'
-        return "%s '%s' (%s groups, %s objects) [%s]" % (self.__class__,
-            self.name, len(self.groups), len(self.matchables), estring)
+        return batches
 
-    def __getitem__(self, *args, **kwargs):
-        return self.matchables.__getitem__(*args, **kwargs)
+    def _active_scan(self):
+        """ Merge the runs of the groups that are active, once for as long as
+            nothing is enabled or disabled
+        """
+        state = (self.version, self.generation)
 
-    def __call__(self, name):
-        return self.get(name)
+        if state != self._scan_state:
+            groups = [group for group in self._runs if group.active]
+            self._scan = list(heapq.merge(*[self._runs[group]
+                for group in groups]))
+            self._scan_groups = set(groups)
+            self._scan_state = state
 
+        return self._scan
 
-class TriggerGroup(Group):
+    def _run(self, line, matched, candidates=None):
+        """ Run the scanned matchables of active groups in order, along with
+            candidates of (order, instance, span) the indexes turned up
 
-    group_type = 'trigger'
+            Groups bound methods enable join from the next line on.
+        """
+        scan = self._active_scan()
 
-    #: deprecated
-    def trigger(self, **kwargs):
-        return self._decorator(**kwargs)
+        if candidates:
+            entries = heapq.merge(candidates, scan)
+        else:
+            entries = scan
 
+        # whether groups are active, until bound methods may have changed it
+        active = {}
 
-class AliasGroup(Group):
+        for entry in entries:
+            instance = entry[1]
 
-    group_type = 'alias'
+            if not instance.enabled:
+                continue
 
-    #: deprecated
-    def alias(self, **kwargs):
-        return self._decorator(**kwargs)
+            group = instance.parent()
+            ok = active.get(group)
 
+            if ok is None:
+                ok = active[group] = group.active
 
-class MasterGroup(Group):
+            if not ok:
+                continue
 
-    def __init__(self):
+            if len(entry) == 2:
+                match = instance.match(line)
+            elif entry[2] is not None:
+                match = instance.match_span(line, *entry[2])
+            else:
+                if instance.index in ('prefilter', 'ci_prefilter'):
+                    instance.prefilter_runs += 1
+                match = instance.match(line)
+
+            if match:
+                matched.append(match)
+
+                if group.exclusive:
+                    break
+
+                active.clear()
+
+    def _build_matcher(self):
+        """ Generate the function run in place of the scan loop """
+        refs = []
+        body = []
+
+        def ref(obj):
+            refs.append(obj)
+            return 'r%d' % (len(refs) - 1)
+
+        last = None
+
+        # shared pattern -> local its result on the line is kept in
+        results = {}
+
+        for _, instance in heapq.merge(*self._runs.values()):
+            # runs of matchables from the same group share one active check,
+            # made again whenever bound methods have run
+            if instance.parent() is not last:
+                last = instance.parent()
+                group = ref(last)
+                body.append('        ok = %s in started and %s.active' % (
+                    group, group))
+
+            name = ref(instance)
+            body.append('        if ok and %s.enabled:' % name)
+
+            if type(instance) is Regex:
+                # run the pattern directly instead of through match(), once
+                # for all the matchables sharing it
+                if instance.shared:
+                    if instance.pattern not in results:
+                        results[instance.pattern] = 's%d' % len(results)
+
+                    result = results[instance.pattern]
+                    body.append('            if %s is missing:' % result)
+                    body.append('                %s = %s(line)' % (result,
+                        ref(instance.pattern.match)))
+                    body.append('            found = %s' % result)
+                else:
+                    body.append('            found = %s(line)' %
+                        ref(instance.pattern.match))
+                body.append('            if found:')
+                body.append('                matched.append(%s.'
+                    'successful_match(line, None, None, found))' % name)
+            else:
+                body.append('            found = %s.match(line)' % name)
+                body.append('            if found:')
+                body.append('                matched.append(found)')
 
-        self.name = 'master'
-        self.enabled = set()
-        self.parent = self
-        self.app = None
-        self.groups = {}
-        self.matchables = {}
+            body.append('                if %s.exclusive:' % group)
+            body.append('                    return')
+            body.append('                ok = %s.active' % group)
 
-        self._to_add = set()
-        self._to_remove = set()
+        source = ['def build(refs):']
 
-        self.in_loop = False
+        if refs:
+            source.append('    %s, = refs' % ', '.join(
+                'r%d' % i for i in range(len(refs))))
+
+        source.append('    missing = object()')
+        source.append('    def matcher(line, matched, started):')
+
+        if results:
+            source.append('        %s = missing' % ' = '.join(
+                sorted(results.values())))
+        source.extend(body or ['        pass'])
+        source.append('    return matcher')
+
+        namespace = {}
+        code = compile('\n'.join(source), '<%s matcher>' % self.group_type,
+            'exec')
+        exec(code, namespace)
+
+        return namespace['build'](refs)
+
+    def _replay(self, replay, line):
+        matched = []
+
+        for instance, args in replay:
+            # a matchable earlier on the line may have disabled this one
+            if instance.enabled and instance.parent().active:
+                matched.append(instance.successful_match(line, *args))
+
+        return matched
+
+    def _scan_literals(self, name, text, candidates):
+        literals = self._indexes[name]
+        prefilter = self._indexes[name.replace('literal', 'prefilter')]
+        automaton = self._automatons[name]
+
+        if automaton is None:
+            keywords = set(literals).union(prefilter)
+            keywords.discard('')
+
+            if len(keywords) < self.automaton_size:
+                automaton = tuple(keywords)
+            else:
+                automaton = Automaton(keywords)
+
+            self._automatons[name] = automaton
+
+        if type(automaton) is tuple:
+            found = find_literals(automaton, text)
+        else:
+            found = automaton.scan(text)
+
+        for literal, span in found.items():
+            if literal in literals:
+                self._gather(literals[literal], candidates, span)
+
+            if literal in prefilter:
+                self._gather(prefilter[literal], candidates)
+
+    def _gather(self, bucket, candidates, span=None):
+        """ Add the matchables of an index bucket's active groups to the
+            candidates
+        """
+        for group, members in bucket.iteritems():
+            if group.active:
+                candidates.extend((i.order, i, span) for i in members)
 
     def _disable(self, instance):
         if self.in_loop:
             self._to_remove.add(instance)
         else:
-            self.enabled.discard(instance)
+            self._discard(instance)
 
     def _enable(self, instance):
         if self.in_loop:
             self._to_add.add(instance)
         else:
-            self.enabled.add(instance)
+            self._add(instance)
 
     def _remove(self, instance):
         if self.in_loop:
             self._to_remove.add(instance)
         else:
-            self.enabled.discard(instance)
+            self._discard(instance)
+
+    def _add(self, instance):
+        if instance in self._armed:
+            return
+
+        self._armed.add(instance)
+        self.version += 1
+
+        if type(instance) is Regex:
+            self._own(instance)
+
+        name, key = self._index_of(instance)
+
+        if name is None:
+            run = self._runs.get(instance.parent())
+
+            if run is None:
+                run = self._runs[instance.parent()] = []
+
+            bisect.insort(run, (instance.order, instance))
+            return
+
+        index = self._indexes[name]
+        bucket = index.get(key)
+
+        if bucket is None:
+            bucket = index[key] = {}
+            self._invalidate(name)
+
+        members = bucket.get(instance.parent())
+
+        if members is None:
+            members = bucket[instance.parent()] = set()
+
+        members.add(instance)
+
+        if instance.index in ('prefilter', 'ci_prefilter'):
+            instance._prefilter_since = self.lines
+
+    def _discard(self, instance):
+        if instance not in self._armed:
+            return
+
+        self._armed.discard(instance)
+        self.version += 1
+
+        if type(instance) is Regex:
+            self._disown(instance)
+
+        name, key = self._index_of(instance)
+
+        if name is None:
+            run = self._runs[instance.parent()]
+            del(run[bisect.bisect_left(run, (instance.order,))])
+
+            if not run:
+                del(self._runs[instance.parent()])
+            return
+
+        index = self._indexes[name]
+        bucket = index.get(key)
+
+        if bucket is not None:
+            members = bucket.get(instance.parent())
+
+            if members is not None:
+                members.discard(instance)
+
+                if not members:
+                    del(bucket[instance.parent()])
+
+            if not bucket:
+                del(index[key])
+                self._invalidate(name)
+
+        if instance.index in ('prefilter', 'ci_prefilter'):
+            instance._prefilter_lines += self.lines - instance._prefilter_since
+            instance._prefilter_since = None
+
+    def _own(self, instance):
+        owners = self._owners.get(instance.pattern)
+
+        if owners is None:
+            owners = self._owners[instance.pattern] = set()
+
+        owners.add(instance)
+
+        if len(owners) > 1:
+            for owner in owners:
+                owner.shared = True
+
+    def _disown(self, instance):
+        owners = self._owners.get(instance.pattern)
+
+        if owners is None:
+            return
+
+        owners.discard(instance)
+        instance.shared = False
+
+        if len(owners) == 1:
+            for owner in owners:
+                owner.shared = False
+
+        if len(owners) < 2:
+            _results.pop(instance.pattern, None)
+
+        if not owners:
+            del(self._owners[instance.pattern])
+
+    def _index_of(self, instance):
+        """ Name of the index a matchable goes in and its key there """
+        name = instance.index
+
+        # a startswith pattern with a whole first word can only match lines
+        # starting with that word, which a dict lookup finds faster than the
+        # literal scan (think aliases)
+        if name in ('literal', 'ci_literal') and \
+                isinstance(instance, Startswith) and ' ' in instance.pattern:
+            return name.replace('literal', 'word'), \
+                instance.pattern.partition(' ')[0]
+
+        if name in ('batch', 'ci_batch', 'sequence'):
+            return name, instance
+
+        return name, instance.literal
+
+    def _invalidate(self, name):
+        if name == 'sequence':
+            self._sequence_order = None
+            return
+
+        if name in self._batches:
+            self._batches[name] = None
+            return
+
+        name = name.replace('prefilter', 'literal')
+
+        if name in self._automatons:
+            self._automatons[name] = None
 
     def flush_set(self):
-        self.enabled.difference_update(self._to_remove)
-        self.enabled.update(self._to_add)
+        if not self._to_add and not self._to_remove:
+            return
+
+        for instance in self._to_remove:
+            self._discard(instance)
+
+        for instance in self._to_add:
+            self._add(instance)
+
         self._to_add.clear()
         self._to_remove.clear()
 
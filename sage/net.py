@@ -8,8 +8,10 @@ from __future__ import absolute_import
 
 import re
 import zlib
+from timeit import default_timer as clock
 
-from twisted.conch.telnet import Telnet, StatefulTelnetProtocol
+from twisted.conch.telnet import Telnet, StatefulTelnetProtocol, \
+    OptionRefused
 from twisted.internet import reactor
 from twisted.internet.protocol import ClientFactory, ServerFactory
 
@@ -108,8 +110,26 @@ class TelnetClient(Telnet):
         sage.gmcp = self.gmcp  # make easily accessible
         self.gmcp_passthrough = True  # send GMCP to client
 
-        # Hold over incomplete app data until the next packet
-        self.data_buffer = ''
+        # Hold over incomplete app data until the next packet, as chunks
+        # joined once the prompt arrives
+        self.data_chunks = []
+        self.data_size = 0
+
+        # lines of the segment were already sent on, see partialSegmentReceived
+        self.data_flushed = False
+
+        # streaming, see applicationDataReceived: complete lines gathered,
+        # when the segment's first data arrived, lines sent on before the
+        # prompt and how long the first of them took
+        self.data_lines = 0
+        self.data_started = None
+        self.data_streamed = 0
+        self._stream_call = None
+
+        #: seconds from the first data of the last streamed segment to its
+        #: first lines being sent on
+        self.first_line_time = None
+
         self.outbound_buffer = ''
 
         # Setup recieving GMCP negotation
@@ -120,7 +140,7 @@ class TelnetClient(Telnet):
         self.options_enabled = (
             GMCP,
             EOR,
-            #COMPRESS2  # MCCP2 seems to break GMCP's Core.Ping in Achaea
+            COMPRESS2
         )
 
         self.options_disabled = ()
@@ -136,16 +156,100 @@ class TelnetClient(Telnet):
         self.receivers.append(receiver)
 
     def applicationDataReceived(self, data):
-        """ Gather data until we get EOR or GA (prompt) """
+        """ Gather data until we get EOR or GA (prompt)
 
-        self.data_buffer += data
+            With ``config.stream_output`` on, complete lines are sent on
+            once ``config.stream_lines`` of them are gathered or
+            ``config.stream_ms`` milliseconds pass without a prompt.
+        """
 
-    def segmentReceived(self):
-        data = self.data_buffer
-        self.data_buffer = ''
+        if self.data_started is None:
+            self.data_started = reactor.seconds()
+
+        self.data_chunks.append(data)
+        self.data_size += len(data)
+
+        if self.data_size > config.max_segment_size:
+            self.partialSegmentReceived()
+        elif config.stream_output:
+            # checked against stream_lines once the packet is parsed, in case
+            # the prompt is in it too
+            self.data_lines += data.count(NL)
+
+            if self._stream_call is None:
+                self._stream_call = reactor.callLater(
+                    config.stream_ms / 1000.0, self._streamTimeout)
+
+    def _streamTimeout(self):
+        self._stream_call = None
+        self.partialSegmentReceived(force=False)
+
+    def partialSegmentReceived(self, force=True):
+        """ Run the complete lines gathered so far through the triggers and
+            send them on without waiting for the prompt
+
+            Called when more than ``config.max_segment_size`` bytes arrive
+            without a prompt, or while streaming. Methods deferred to the
+            prompt still wait for it.
+
+            :param force: (optional) send an incomplete line if there are no
+                complete ones
+        """
+
+        data = ''.join(self.data_chunks)
+
+        if not self.data_flushed:
+            data = self._tidy(data)
+
+        end = data.rfind(NL)
+
+        if end == -1 and not force:
+            return
+
+        self.data_flushed = True
+
+        if end == -1:
+            # a single line that long, send it as it is. The newline ending
+            # it is then dropped like the one after a prompt.
+            end = len(data)
+            self.data_flushed = False
+
+        self.data_chunks = [data[end + 1:]]
+        self.data_size = len(self.data_chunks[0])
+        self.data_lines = 0
+
+        if self._stream_call is not None:
+            self._stream_call.cancel()
+            self._stream_call = None
+
+        self.linesReceived(data[:end].split(NL))
+
+    def linesReceived(self, lines):
+        """ Process and send on lines that aren't followed by a prompt yet """
+
+        if not self.data_streamed:
+            self.first_line_time = reactor.seconds() - self.data_started
+
+        self.data_streamed += len(lines)
+
+        lines = inbound.receiver(lines, final=False)
+
+        signal.pre_outbound.send(
+            raw_lines=sage.buffer,
+            lines=lines,
+            ansi_prompt=None,
+            prompt=None
+        )
+
+        self.receivers.input(lines, None)
+
+        sage.triggers.run_pending()
+
+    def _tidy(self, data):
+        """ Clean up the start of a segment """
 
         # don't lead with a newline
-        if data[0] == NL:
+        if data[:1] == NL:
             data = data[1:]
 
         # Fix color-only leading line
@@ -154,6 +258,29 @@ class TelnetClient(Telnet):
             color = data[0:color_newline.end() - 1]
             data = color + data[color_newline.end():]
 
+        return data
+
+    def segmentReceived(self):
+        data = ''.join(self.data_chunks)
+        self.data_chunks = []
+        self.data_size = 0
+        self.data_lines = 0
+        self.data_started = None
+
+        if self._stream_call is not None:
+            self._stream_call.cancel()
+            self._stream_call = None
+
+        if self.data_streamed:
+            _log.msg("Sent %d lines before the prompt, the first after %.1fms"
+                % (self.data_streamed, self.first_line_time * 1000))
+            self.data_streamed = 0
+
+        if self.data_flushed:
+            self.data_flushed = False
+        else:
+            data = self._tidy(data)
+
         data = data.split('\n')
 
         pre_prompt.send(raw_data=data)
@@ -185,6 +312,9 @@ class TelnetClient(Telnet):
 
         self.receivers.input(lines, prompt_output)
 
+        # post-output triggers run once the lines have gone out
+        sage.triggers.run_pending()
+
     def connect(self):
         """ Initiate connection to Achaea """
         if not sage.connected:
@@ -197,6 +327,7 @@ class TelnetClient(Telnet):
     def reset(self):
         """ Reset the client for a new connection """
         self.options = {}  # reset negotiation options
+        self.endCompress()
         self.gmcp = gmcp.GMCP(self)
         sage.gmcp = self.gmcp
 
@@ -210,7 +341,11 @@ class TelnetClient(Telnet):
         sage._send = self.transport.write
 
     def connectionLost(self, reason):
-        self.receivers.write(self.data_buffer)
+        if self._stream_call is not None:
+            self._stream_call.cancel()
+            self._stream_call = None
+
+        self.receivers.write(''.join(self.data_chunks))
         sage.connected = False
         signal.disconnected.send()
 
@@ -227,26 +362,75 @@ class TelnetClient(Telnet):
 
 
     def dataReceived(self, data):
-        """ Recieves and processes raw data from the server """
+        """ Recieves and processes raw data from the server
+
+            Runs of application data are found with ``str.find`` and sliced
+            out whole. Only telnet commands are walked byte by byte.
+        """
 
         if sage.lagging:
             sage.lagging = False
             signal.lag_recovered.send()
 
-        #if self.compress:  # disabled until it works with GMCP
-            #data = self.decompressobj.decompress(data)
+        if self.compress:
+            data = self.decompress(data)
+
+        # the data was compressed when it arrived
+        compressed = self.compress
 
         appDataBuffer = []
 
-        for b in data:
-            if self.state == 'data':
-                if b == IAC:
+        find = data.find
+        end = len(data)
+        index = 0
+
+        # next IAC and CR at or after index, -1 once there are none left
+        iac = find(IAC)
+        cr = find(CR)
+
+        while index < end:
+            state = self.state
+
+            if state == 'data':
+                if -1 < iac < index:
+                    iac = find(IAC, index)
+                if -1 < cr < index:
+                    cr = find(CR, index)
+
+                if iac == -1 and cr == -1:
+                    appDataBuffer.append(data[index:])
+                    break
+
+                if cr == -1 or -1 < iac < cr:
+                    stop = iac
                     self.state = 'escaped'
-                elif b == '\r':
-                    self.state = 'newline'
                 else:
-                    appDataBuffer.append(b)
-            elif self.state == 'escaped':
+                    stop = cr
+                    self.state = 'newline'
+
+                if stop > index:
+                    appDataBuffer.append(data[index:stop])
+
+                index = stop + 1
+                continue
+
+            if state == 'subnegotiation':
+                if -1 < iac < index:
+                    iac = find(IAC, index)
+
+                if iac == -1:
+                    self.commands.extend(data[index:])
+                    break
+
+                self.commands.extend(data[index:iac])
+                self.state = 'subnegotiation-escaped'
+                index = iac + 1
+                continue
+
+            b = data[index]
+            index += 1
+
+            if state == 'escaped':
                 if b == IAC:
                     appDataBuffer.append(b)
                     self.state = 'data'
@@ -268,7 +452,7 @@ class TelnetClient(Telnet):
                     self.state = 'data'
                     appDataBuffer.append(b)
                     error("Unexpected signal: %s" % ord(b))
-            elif self.state == 'command':
+            elif state == 'command':
                 self.state = 'data'
                 command = self.command
                 del self.command
@@ -276,7 +460,7 @@ class TelnetClient(Telnet):
                     self.applicationDataReceived(''.join(appDataBuffer))
                     del appDataBuffer[:]
                 self.commandReceived(command, b)
-            elif self.state == 'newline':
+            elif state == 'newline':
                 self.state = 'data'
                 if b == '\n':
                     appDataBuffer.append('\n')
@@ -297,12 +481,7 @@ class TelnetClient(Telnet):
                     self.state = 'escaped'
                 else:
                     appDataBuffer.append('\r' + b)
-            elif self.state == 'subnegotiation':
-                if b == IAC:
-                    self.state = 'subnegotiation-escaped'
-                else:
-                    self.commands.append(b)
-            elif self.state == 'subnegotiation-escaped':
+            elif state == 'subnegotiation-escaped':
                 if b == SE:
                     self.state = 'data'
                     commands = self.commands
@@ -311,6 +490,12 @@ class TelnetClient(Telnet):
                         self.applicationDataReceived(''.join(appDataBuffer))
                         del appDataBuffer[:]
                     self.negotiate(commands)
+
+                    if self.compress and not compressed:
+                        # MCCP2: the zlib stream starts right after IAC SE
+                        if index < end:
+                            self.dataReceived(data[index:])
+                        return
                 else:
                     self.state = 'subnegotiation'
                     self.commands.append(b)
@@ -320,6 +505,9 @@ class TelnetClient(Telnet):
         if appDataBuffer:
             self.applicationDataReceived(''.join(appDataBuffer))
 
+        if config.stream_output and self.data_lines >= config.stream_lines:
+            self.partialSegmentReceived(force=False)
+
     def enableRemote(self, option):
 
         if option in self.options_enabled:
@@ -332,10 +520,46 @@ class TelnetClient(Telnet):
 
         return False
 
+    def disableRemote(self, option):
+        if option == COMPRESS2:
+            self.endCompress()
+
     def enableCompress(self, data):
-        """ Called for IAC SB COMPRESS2. Enable compression. """
+        """ Called for IAC SB COMPRESS2. Everything after it is compressed. """
 
         self.compress = True
+        self.decompressobj = zlib.decompressobj()
+
+    def endCompress(self):
+        """ Go back to uncompressed data """
+
+        self.compress = False
+        self.decompressobj = zlib.decompressobj()
+
+    def decompress(self, data):
+        """ Decompress MCCP2 data
+
+            When the server ends the compressed stream, whatever follows it
+            is passed on uncompressed.
+        """
+
+        try:
+            inflated = self.decompressobj.decompress(data)
+        except zlib.error as err:
+            # the rest of the stream can't be made sense of
+            _log.msg("MCCP2 stream is corrupt (%s). Disconnecting." % err)
+            self.endCompress()
+            self.transport.loseConnection()
+            return ''
+
+        rest = self.decompressobj.unused_data
+
+        if rest:
+            # Z_STREAM_END: the server stopped compressing
+            self.endCompress()
+            return inflated + rest
+
+        return inflated
 
     def gmcpReceived(self, data):
         """ Send GMCP data to the GMCP reciever """
@@ -369,6 +593,9 @@ class TelnetClient(Telnet):
                 if line:
                     self.transport.write(line + CR + NL + GA)
 
+        # post-output aliases run once the commands have gone out
+        sage.aliases.run_pending()
+
 
 # client instance
 client = TelnetClient()
@@ -408,10 +635,22 @@ class TelnetServer(Telnet, StatefulTelnetProtocol, ISageProxyReceiver):
         self.options_enabled = (
             GMCP,
             EOR,
+            COMPRESS2
         )
 
         self.options_disabled = ()
 
+        # MCCP2 toward the local client, see startCompress()
+        self.compressobj = None
+        self._flush_call = None
+
+        #: bytes written while compressing, before and after compression
+        self.bytes_raw = 0
+        self.bytes_compressed = 0
+
+        #: seconds spent compressing
+        self.compress_time = 0.0
+
         if self not in self.client.receivers:
             self.client.addReceiver(self)
 
@@ -445,6 +684,10 @@ class TelnetServer(Telnet, StatefulTelnetProtocol, ISageProxyReceiver):
 
         self.will(GMCP)
 
+        # plenty of clients don't do MCCP2
+        self.will(COMPRESS2).addErrback(lambda failure:
+            failure.trap(OptionRefused))
+
         if len(self.client.outbound_buffer) > 0:
             self.write(">>> Start Buffer >>>\n")
             self.write(self.client.outbound_buffer)
@@ -454,6 +697,12 @@ class TelnetServer(Telnet, StatefulTelnetProtocol, ISageProxyReceiver):
 
     def connectionLost(self, reason):
         self.connected = False
+        self.compressobj = None
+
+        if self._flush_call is not None:
+            self._flush_call.cancel()
+            self._flush_call = None
+
         self.factory.transports.remove(self.transport)
         self.reset()
         if sage.connected:
@@ -487,23 +736,109 @@ class TelnetServer(Telnet, StatefulTelnetProtocol, ISageProxyReceiver):
         if len(self.factory.transports) == 0:
             self.client.outbound_buffer += data
 
-        self.transport.write(data)
+        self._write(data)
+
+    def _write(self, data):
+        """ Everything sent to the client goes through here, compressed
+            once MCCP2 has started
+        """
+
+        if self.compressobj is None:
+            self.transport.write(data)
+            return
+
+        start = clock()
+        out = self.compressobj.compress(data)
+
+        if data.endswith(IAC + EORD) or data.endswith(IAC + GA):
+            # a prompt, the client gets everything up to it right away
+            out += self.compressobj.flush(zlib.Z_SYNC_FLUSH)
+
+            if self._flush_call is not None:
+                self._flush_call.cancel()
+                self._flush_call = None
+        elif self._flush_call is None:
+            # echoes and GMCP go out at the end of this reactor turn
+            self._flush_call = reactor.callLater(0, self._flush)
+
+        self.compress_time += clock() - start
+        self.bytes_raw += len(data)
+        self.bytes_compressed += len(out)
+
+        if out:
+            self.transport.write(out)
+
+    def _flush(self):
+        self._flush_call = None
+
+        if self.compressobj is not None:
+            start = clock()
+            out = self.compressobj.flush(zlib.Z_SYNC_FLUSH)
+            self.compress_time += clock() - start
+            self.bytes_compressed += len(out)
+            self.transport.write(out)
 
     def enableLocal(self, option):
         if option == GMCP:
             self.client.gmcp_passthrough = True
             return True
 
+        if option == COMPRESS2:
+            # the WILL may not have been sent yet, start after it
+            reactor.callLater(0, self.startCompress)
+            return True
+
         return False
 
+    def disableLocal(self, option):
+        if option == COMPRESS2:
+            self.endCompress()
+
+    def startCompress(self):
+        """ Start compressing everything sent to the client """
+
+        if self.compressobj is not None or not self.connected:
+            return
+
+        self.transport.write(IAC + SB + COMPRESS2 + IAC + SE)
+        self.compressobj = zlib.compressobj()
+
+    def endCompress(self):
+        """ End the compressed stream, sending uncompressed from then on """
+
+        if self.compressobj is None:
+            return
+
+        if self._flush_call is not None:
+            self._flush_call.cancel()
+            self._flush_call = None
+
+        out = self.compressobj.flush(zlib.Z_FINISH)
+        self.compressobj = None
+        self.bytes_compressed += len(out)
+        self.transport.write(out)
+
+    @property
+    def compression_ratio(self):
+        """ Bytes before compression for every byte sent """
+
+        if not self.bytes_compressed:
+            return 0.0
+
+        return float(self.bytes_raw) / self.bytes_compressed
+
     def input(self, lines, prompt):
-        """ Assembles data from Achaea, passes it to self.write to be emitted to clients """
+        """ Assembles data from Achaea, passes it to self.write to be emitted to clients
+
+            A prompt of None sends the lines alone.
+        """
         if len(lines) > 0:
             output = '\r\n'.join(lines) +'\r\n'
         else:
             output = ''
 
-        output += prompt + IAC + EORD
+        if prompt is not None:
+            output += prompt + IAC + EORD
 
         self.write(output)
 
@@ -536,3 +871,20 @@ def disconnect(alias):
 def disconnect(alias):
     client.disconnect()
 
+
+@net_aliases.exact('.mccp')
+def mccp(alias):
+    """ Echo compression stats of every local client """
+
+    for receiver in client.receivers:
+        if not isinstance(receiver, TelnetServer) or not receiver.connected:
+            continue
+
+        peer = receiver.transport.getPeer()
+
+        sage.echo("%s:%s %s, %d bytes -> %d (%.2fx), %.3fs" % (
+            getattr(peer, 'host', '?'), getattr(peer, 'port', '?'),
+            'compressed' if receiver.compressobj else 'uncompressed',
+            receiver.bytes_raw, receiver.bytes_compressed,
+            receiver.compression_ratio, receiver.compress_time))
+
@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+"""
+    Opt-in profiling of triggers and aliases.
+
+    While profiling is off, matchables run their normal methods and nothing is
+    counted or timed. Turning it on swaps instrumented versions of
+    ``match``, ``match_span``, ``successful_match`` and ``call_methods`` into
+    the matchable classes. Usually used through the master groups: ::
+
+        sage.triggers.profile()
+        sage.triggers.stats(sort='match_time', top=10)
+        sage.triggers.stats(by='app')
+        sage.triggers.reset_stats()
+"""
+from __future__ import absolute_import
+from functools import wraps
+from timeit import default_timer as clock
+from weakref import WeakKeyDictionary
+from sage import apps
+
+
+class Record(object):
+    """ Counters for a single matchable """
+
+    __slots__ = ('evaluations', 'hits', 'match_time', 'callback_time')
+
+    def __init__(self):
+        #: times the matchable was run against a line
+        self.evaluations = 0
+
+        #: successful matches
+        self.hits = 0
+
+        #: seconds spent matching, not counting bound methods
+        self.match_time = 0.0
+
+        #: seconds spent in bound methods
+        self.callback_time = 0.0
+
+    def add(self, other):
+        self.evaluations += other.evaluations
+        self.hits += other.hits
+        self.match_time += other.match_time
+        self.callback_time += other.callback_time
+
+
+class Report(list):
+    """ Rows of (name, :class:`Record`) sorted and ready to print """
+
+    columns = ('evaluations', 'hits', 'match_time', 'callback_time')
+
+    def __repr__(self):
+        width = max([len(name) for name, _ in self] + [4])
+        header = "%-*s %12s %10s %12s %14s" % ((width, 'name') + self.columns)
+        out = [header, '-' * len(header)]
+
+        for name, record in self:
+            out.append("%-*s %12d %10d %12.6f %14.6f" % (width, name,
+                record.evaluations, record.hits, record.match_time,
+                record.callback_time))
+
+        return '\n'.join(out)
+
+
+class Profiler(object):
+    """ Collects :class:`Record` counters for matchables """
+
+    #: methods that get swapped for instrumented ones
+    instrumented = ('match', 'match_span', 'successful_match', 'call_methods')
+
+    def __init__(self):
+        #: matchable -> Record, dropped along with destroyed matchables
+        self.records = WeakKeyDictionary()
+
+        #: matchable types ('trigger', 'alias') being profiled
+        self.types = set()
+
+        # (class, method name) -> original method
+        self._originals = {}
+
+        # running total of time spent in bound methods
+        self._callback_time = 0.0
+
+    def enable(self, mtype):
+        """ Start profiling matchables of a type """
+        self.types.add(mtype)
+
+        if not self._originals:
+            self._patch()
+
+    def disable(self, mtype):
+        """ Stop profiling matchables of a type. Counters are kept. """
+        self.types.discard(mtype)
+
+        if not self.types:
+            self._unpatch()
+
+    def reset(self, mtype):
+        """ Clear counters of matchables of a type """
+        for instance in self.records.keys():
+            if instance.type == mtype:
+                del(self.records[instance])
+
+    def report(self, mtype, by='matchable', sort='match_time', top=None):
+        """ Build a :class:`Report`
+
+            :param mtype: matchable type ('trigger' or 'alias')
+            :param by: (optional) 'matchable', 'group' or 'app'
+            :param sort: (optional) column to sort by (descending). One of
+                'evaluations', 'hits', 'match_time', 'callback_time' or 'time'
+                for match and callback time combined.
+            :param top: (optional) only include the first number of rows
+        """
+
+        records = dict((instance, record) for instance, record
+            in self.records.items() if instance.type == mtype)
+
+        if by == 'matchable':
+            rows = [(_path(instance), record) for instance, record
+                in records.items()]
+        elif by == 'group':
+            rows = self._rollup(records, lambda instance: _path(
+                instance.parent()) if instance.parent() else '<destroyed>')
+        elif by == 'app':
+            rows = []
+            for app, groups in apps.groups.items():
+                total = Record()
+                for group in groups:
+                    for instance in group.matchables.values():
+                        if instance in records:
+                            total.add(records[instance])
+                if total.evaluations or total.hits:
+                    rows.append((app, total))
+        else:
+            raise ValueError("Can't group stats by '%s'" % by)
+
+        if sort == 'time':
+            key = lambda row: row[1].match_time + row[1].callback_time
+        elif sort in Report.columns:
+            key = lambda row: getattr(row[1], sort)
+        else:
+            raise ValueError("Can't sort stats by '%s'" % sort)
+
+        rows.sort(key=key, reverse=True)
+
+        return Report(rows[:top] if top else rows)
+
+    def _rollup(self, records, keyfunc):
+        totals = {}
+
+        for instance, record in records.items():
+            key = keyfunc(instance)
+            if key not in totals:
+                totals[key] = Record()
+            totals[key].add(record)
+
+        return totals.items()
+
+    def _record(self, instance):
+        record = self.records.get(instance)
+
+        if record is None:
+            record = self.records[instance] = Record()
+
+        return record
+
+    def _patch(self):
+        from sage.matching import Matchable
+
+        for klass in _subclasses(Matchable):
+            for name in self.instrumented:
+                if name in klass.__dict__:
+                    original = klass.__dict__[name]
+                    self._originals[(klass, name)] = original
+                    setattr(klass, name,
+                        getattr(self, '_wrap_' + name)(original))
+
+    def _unpatch(self):
+        for (klass, name), original in self._originals.items():
+            setattr(klass, name, original)
+
+        self._originals.clear()
+
+    def _wrap_match(self, func):
+        profiler = self
+
+        @wraps(func)
+        def wrapper(instance, *args, **kwargs):
+            if instance.type not in profiler.types:
+                return func(instance, *args, **kwargs)
+
+            callbacks = profiler._callback_time
+            start = clock()
+            result = func(instance, *args, **kwargs)
+            elapsed = clock() - start
+
+            record = profiler._record(instance)
+            record.evaluations += 1
+            record.match_time += elapsed - (profiler._callback_time - callbacks)
+
+            return result
+
+        return wrapper
+
+    _wrap_match_span = _wrap_match
+
+    def _wrap_successful_match(self, func):
+        profiler = self
+
+        @wraps(func)
+        def wrapper(instance, *args, **kwargs):
+            if instance.type in profiler.types:
+                profiler._record(instance).hits += 1
+
+            return func(instance, *args, **kwargs)
+
+        return wrapper
+
+    def _wrap_call_methods(self, func):
+        profiler = self
+
+        @wraps(func)
+        def wrapper(instance, *args, **kwargs):
+            if instance.type not in profiler.types:
+                return func(instance, *args, **kwargs)
+
+            start = clock()
+            result = func(instance, *args, **kwargs)
+            elapsed = clock() - start
+
+            profiler._record(instance).callback_time += elapsed
+            profiler._callback_time += elapsed
+
+            return result
+
+        return wrapper
+
+
+def _subclasses(klass):
+    found = set([klass])
+
+    for subclass in klass.__subclasses__():
+        found.update(_subclasses(subclass))
+
+    return found
+
+
+def _path(obj):
+    parts = []
+
+    while obj is not None and obj.parent is not obj:
+        parts.append(obj.name)
+        obj = obj.parent()
+
+    return '/'.join(reversed(parts))
+
+
+#: profiler shared by the trigger and alias master groups
+profiler = Profiler()
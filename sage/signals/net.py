@@ -7,7 +7,9 @@ connected = Signal()
 #: Disconnected from Achaea
 disconnected = Signal()
 
-#: Processed lines about to go out to the client
+#: Processed lines about to go out to the client. Lines sent on ahead of
+#: their prompt (see ``stream_output`` and ``max_segment_size``) come with
+#: ``prompt`` and ``ansi_prompt`` set to None.
 pre_outbound = Signal(providing_args=['raw_lines', 'lines', 'prompt', 'ansi_prompt'])
 
 #: Sage is lagging
@@ -68,6 +68,26 @@ def touch(fname, times=None):
         os.utime(fname, times)
 
 
+class cached_property(object):
+    """ Property computed on first access and then stored on the instance
+
+        The value goes into the instance's ``__dict__`` under the same name,
+        so later lookups never reach the descriptor again.
+    """
+
+    def __init__(self, func):
+        self.func = func
+        self.__doc__ = func.__doc__
+        self.__name__ = func.__name__
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+
+        value = instance.__dict__[self.__name__] = self.func(instance)
+        return value
+
+
 class MutableInt(object):
 
     def __init__(self, value=None):
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+    Aho-Corasick multi-pattern string search.
+
+    Finds every occurrence of a set of literal keywords in a single pass over
+    the text, regardless of how many keywords there are.
+"""
+from __future__ import absolute_import
+from collections import deque
+
+
+class Automaton(object):
+    """ Compiled set of keywords
+
+        :param keywords: iterable of strings to search for
+    """
+
+    def __init__(self, keywords):
+        # state 0 is the root
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [()]
+
+        for keyword in set(keywords):
+            if keyword:
+                self._add(keyword)
+
+        self._link()
+
+    def _add(self, keyword):
+        state = 0
+
+        for char in keyword:
+            nxt = self._goto[state].get(char)
+
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+
+            state = nxt
+
+        self._out[state] = ((keyword, len(keyword)),)
+
+    def _link(self):
+        goto = self._goto
+        fail = self._fail
+        out = self._out
+
+        queue = deque(goto[0].values())
+
+        while queue:
+            state = queue.popleft()
+
+            for char, nxt in goto[state].items():
+                queue.append(nxt)
+
+                f = fail[state]
+                while f and char not in goto[f]:
+                    f = fail[f]
+
+                f = goto[f].get(char, 0)
+
+                if f == nxt:
+                    f = 0
+
+                fail[nxt] = f
+                out[nxt] = out[nxt] + out[f]
+
+    def scan(self, text):
+        """ Find all keywords in text
+
+            :param text: string to search
+            :returns: dict of keyword -> (first, last) offsets the keyword
+                starts at in text
+        """
+
+        goto = self._goto
+        fail = self._fail
+        out = self._out
+
+        found = {}
+        state = 0
+
+        for index, char in enumerate(text):
+            nxt = goto[state].get(char)
+
+            while nxt is None and state:
+                state = fail[state]
+                nxt = goto[state].get(char)
+
+            state = nxt or 0
+
+            if out[state]:
+                for keyword, length in out[state]:
+                    start = index - length + 1
+
+                    if keyword in found:
+                        found[keyword] = (found[keyword][0], start)
+                    else:
+                        found[keyword] = (start, start)
+
+        return found
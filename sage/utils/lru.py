@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+    Least-recently-used cache with hit and miss counters.
+"""
+from __future__ import absolute_import
+from collections import OrderedDict
+
+
+class LRUCache(object):
+    """ Mapping that forgets the least recently used keys past a size
+
+        :param size: maximum number of keys kept
+    """
+
+    def __init__(self, size):
+        self.size = size
+
+        #: lookups that found their key
+        self.hits = 0
+
+        #: lookups that didn't
+        self.misses = 0
+
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        """ Look up a key, marking it as recently used """
+        data = self._data
+
+        if key not in data:
+            self.misses += 1
+            return default
+
+        self.hits += 1
+
+        # move the key to the most recently used end
+        value = data.pop(key)
+        data[key] = value
+
+        return value
+
+    def set(self, key, value):
+        """ Store a value, evicting the least recently used key if full """
+        data = self._data
+
+        if key in data:
+            del(data[key])
+        elif len(data) >= self.size:
+            data.popitem(last=False)
+
+        data[key] = value
+
+    def clear(self):
+        """ Forget all keys. Counters are kept. """
+        self._data.clear()
+
+    @property
+    def ratio(self):
+        """ Fraction of lookups that were hits """
+        lookups = self.hits + self.misses
+
+        if not lookups:
+            return 0.0
+
+        return float(self.hits) / lookups
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
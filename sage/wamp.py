@@ -65,9 +65,13 @@ class WampComponent(ApplicationSession, ISageProxyReceiver):
     def input(self, lines, prompt):
         """ Lines + Prompt emitted by Sage, should be sent to local client
 
-        This is done by publishing to the 'io' channel.
+        This is done by publishing to the 'io' channel. A prompt of None
+        sends the lines alone.
         """
-        outgoing = '{}\r\n{}'.format('\r\n'.join(lines), prompt)
+        if prompt is None:
+            outgoing = '\r\n'.join(lines)
+        else:
+            outgoing = '{}\r\n{}'.format('\r\n'.join(lines), prompt)
         self.publish(self.channels['io'], outgoing)
 
     def publish_to_client(self, channel, data):
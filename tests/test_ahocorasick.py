@@ -0,0 +1,25 @@
+from twisted.trial import unittest
+from sage.utils.ahocorasick import Automaton
+
+
+class AutomatonTests(unittest.TestCase):
+
+    def test_single_pass(self):
+        automaton = Automaton(['he', 'she', 'his', 'hers'])
+        found = automaton.scan('ushers')
+
+        self.assertEqual({'she': (1, 1), 'he': (2, 2), 'hers': (2, 2)},
+            found)
+
+    def test_first_and_last(self):
+        automaton = Automaton(['ab'])
+
+        self.assertEqual({'ab': (0, 4)}, automaton.scan('abxxab'))
+
+    def test_no_match(self):
+        automaton = Automaton(['needle'])
+
+        self.assertEqual({}, automaton.scan('haystack'))
+
+    def test_empty(self):
+        self.assertEqual({}, Automaton([]).scan('anything'))
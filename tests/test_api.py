@@ -0,0 +1,140 @@
+from twisted.trial import unittest
+from twisted.internet.task import Clock
+from sage.api import TimerWheel
+
+
+class StrictClock(Clock):
+    """ Rejects negative delays like the real reactor """
+
+    def callLater(self, delay, *args, **kwargs):
+        assert delay >= 0, delay
+        return Clock.callLater(self, delay, *args, **kwargs)
+
+
+class TimerWheelTests(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = StrictClock()
+        self.wheel = TimerWheel(tick=0.1, slots=8, clock=self.clock)
+        self.calls = []
+
+    def test_fires_on_time(self):
+        self.wheel.schedule(0.25, self.calls.append, ('a',))
+
+        self.clock.advance(0.2)
+        self.assertEqual([], self.calls)
+
+        self.clock.advance(0.1)
+        self.assertEqual(['a'], self.calls)
+        self.assertEqual(0, len(self.wheel))
+        self.assertEqual([], self.clock.getDelayedCalls())
+
+    def test_single_reactor_call(self):
+        for i in range(100):
+            self.wheel.schedule(i * 0.05, self.calls.append, (i,))
+
+        self.assertEqual(1, len(self.clock.getDelayedCalls()))
+
+        self.clock.pump([0.1] * 60)
+
+        self.assertEqual(range(100), self.calls)
+
+    def test_coalesced(self):
+        self.wheel.schedule(0.12, self.calls.append, ('b',))
+        self.wheel.schedule(0.11, self.calls.append, ('a',))
+        self.wheel.schedule(0.3, self.calls.append, ('c',))
+
+        self.clock.advance(0.2)
+
+        # both due on the same tick run together, in the order they were due
+        self.assertEqual(['a', 'b'], self.calls)
+
+    def test_beyond_one_turn(self):
+        self.wheel.schedule(0.1, self.calls.append, ('near',))
+        self.wheel.schedule(1.7, self.calls.append, ('far',))
+
+        self.clock.pump([0.1] * 10)
+        self.assertEqual(['near'], self.calls)
+
+        self.clock.pump([0.1] * 8)
+        self.assertEqual(['near', 'far'], self.calls)
+
+    def test_late_tick(self):
+        self.wheel.schedule(0.1, self.calls.append, ('a',))
+        self.wheel.schedule(5, self.calls.append, ('b',))
+
+        self.clock.advance(10)
+
+        self.assertEqual(['a', 'b'], self.calls)
+
+    def test_cancel(self):
+        timer = self.wheel.schedule(0.1, self.calls.append, ('a',))
+        timer.cancel()
+
+        self.assertFalse(timer.active())
+        self.assertEqual(0, len(self.wheel))
+        self.assertEqual([], self.clock.getDelayedCalls())
+
+        self.clock.advance(1)
+        self.assertEqual([], self.calls)
+
+    def test_cancel_tag(self):
+        self.wheel.schedule(0.1, self.calls.append, ('a',), tag='cures')
+        self.wheel.schedule(0.2, self.calls.append, ('b',), tag='cures')
+        self.wheel.schedule(0.2, self.calls.append, ('c',))
+
+        self.assertEqual(2, self.wheel.cancel_tag('cures'))
+        self.assertEqual(0, self.wheel.cancel_tag('cures'))
+
+        self.clock.advance(1)
+        self.assertEqual(['c'], self.calls)
+
+    def test_kwargs_and_errors(self):
+        def broken():
+            raise ValueError('broken')
+
+        self.wheel.schedule(0.1, broken)
+        self.wheel.schedule(0.1, lambda name: self.calls.append(name),
+            kwargs={'name': 'a'})
+
+        self.clock.advance(0.1)
+
+        self.assertEqual(['a'], self.calls)
+        self.assertEqual(1, len(self.flushLoggedErrors(ValueError)))
+
+    def test_after_idle(self):
+        self.wheel.schedule(0.05, self.calls.append, ('a',))
+        self.clock.advance(0.1)
+        self.clock.advance(10)
+
+        self.wheel.schedule(0.05, self.calls.append, ('b',))
+
+        self.clock.advance(0.05)
+        self.assertEqual(['a'], self.calls)
+
+        self.clock.advance(0.05)
+        self.assertEqual(['a', 'b'], self.calls)
+
+    def test_after_cancel_and_fire(self):
+        timer = self.wheel.schedule(0.3, self.calls.append, ('a',))
+        self.wheel.schedule(0.1, self.calls.append, ('b',))
+        self.clock.advance(0.1)
+        timer.cancel()
+        self.clock.advance(5)
+
+        self.wheel.schedule(0.1, self.calls.append, ('c',))
+        self.clock.advance(0.1)
+
+        self.assertEqual(['b', 'c'], self.calls)
+
+    def test_schedule_while_firing(self):
+        def again():
+            self.calls.append('first')
+            self.wheel.schedule(0.1, self.calls.append, ('second',))
+
+        self.wheel.schedule(0.1, again)
+
+        self.clock.advance(0.1)
+        self.clock.advance(0.1)
+
+        self.assertEqual(['first', 'second'], self.calls)
@@ -0,0 +1,33 @@
+from twisted.trial import unittest
+from sage.utils.lru import LRUCache
+
+
+class LRUCacheTests(unittest.TestCase):
+
+    def test_evicts_least_recent(self):
+        cache = LRUCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+        self.assertIn('c', cache)
+
+    def test_counters(self):
+        cache = LRUCache(2)
+        cache.set('a', 1)
+
+        self.assertEqual(1, cache.get('a'))
+        self.assertEqual(None, cache.get('b'))
+        self.assertEqual((1, 1, 0.5), (cache.hits, cache.misses, cache.ratio))
+
+    def test_clear(self):
+        cache = LRUCache(2)
+        cache.set('a', 1)
+        cache.get('a')
+        cache.clear()
+
+        self.assertEqual(0, len(cache))
+        self.assertEqual(1, cache.hits)
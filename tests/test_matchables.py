@@ -1,5 +1,18 @@
 from twisted.trial import unittest
+from twisted.internet.task import Clock
+from twisted.python import log
 from sage import triggers, aliases, apps
+from sage.matching import required_literal, batchable, find_literals, \
+    Exact, Match
+from sage.profiling import profiler
+from sage.utils.ahocorasick import Automaton
+from sage.inbound import Line
+from sage import matching, outbound, inbound
+import gc
+import json
+import os
+import re
+import weakref
 from random import choice
 
 
@@ -178,6 +191,55 @@ class TestHooks(unittest.TestCase):
 
         trigger.call_methods()
 
+    def test_unbind(self):
+        trigger = triggers.get('test_hooks/test_0')
+        calls = []
+
+        def test_callback(matchable):
+            calls.append(matchable)
+
+        trigger.bind(test_callback)
+        trigger.unbind(test_callback)
+        trigger.call_methods()
+
+        self.assertEqual([], calls)
+        self.assertEqual([], trigger.methods)
+
+    def test_bound_method_weak(self):
+        trigger = triggers.get('test_hooks/test_0')
+        calls = []
+
+        class Receiver(object):
+            def callback(self, matchable):
+                calls.append(matchable)
+
+        receiver = Receiver()
+        trigger.bind(receiver.callback)
+        trigger.call_methods()
+
+        del(receiver)
+        trigger.call_methods()
+
+        self.assertEqual([trigger], calls)
+        self.assertEqual([], trigger.methods)
+
+    def test_hook_error(self):
+        trigger = triggers.get('test_hooks/test_0')
+        calls = []
+
+        def test_callback_1(matchable):
+            raise RuntimeError('failed')
+
+        def test_callback_2(matchable):
+            calls.append(matchable)
+
+        trigger.bind(test_callback_1)
+        trigger.bind(test_callback_2)
+        trigger.call_methods()
+
+        self.assertEqual([trigger], calls)
+        self.assertEqual(1, len(self.flushLoggedErrors(RuntimeError)))
+
 
 
 class TestApps(unittest.TestCase):
@@ -224,5 +286,1402 @@ class TestGroups(unittest.TestCase):
         self.assertFalse(self.l1.enabled)
         self.assertTrue(self.l3.enabled)
 
+class TestExactIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.group = triggers.create_group('test_exact', app='sage')
+        self.hits = []
+
+    def tearDown(self):
+        triggers('test_exact').destroy()
+
+    def _hit(self, trigger):
+        self.hits.append(trigger.name)
+
+    def test_exact_lookup(self):
+        self.group.create('exact', 'exact', 'An exact line.', [self._hit])
+        self.group.create('other', 'exact', 'Another line.', [self._hit])
+
+        matched = triggers.match('An exact line.')
+
+        self.assertEqual(['exact'], [m.name for m in matched])
+        self.assertEqual(['exact'], self.hits)
+        self.assertIn('An exact line.', triggers._exact)
+
+    def test_ci_exact_lookup(self):
+        self.group.create('ci', 'exact', 'An Exact Line.', [self._hit],
+            ignorecase=False)
+
+        triggers.match('an EXACT line.')
+
+        self.assertEqual(['ci'], self.hits)
+
+    def test_disable_unindexes(self):
+        trigger = self.group.create('exact', 'exact', 'An exact line.',
+            [self._hit])
+        trigger.disable()
+
+        triggers.match('An exact line.')
+
+        self.assertEqual([], self.hits)
+        self.assertNotIn('An exact line.', triggers._exact)
+
+    def test_enable_in_loop_is_deferred(self):
+        trigger = self.group.create('exact', 'exact', 'An exact line.',
+            [self._hit], enabled=False)
+
+        triggers.in_loop = True
+        trigger.enable()
+        triggers.match('An exact line.')
+        triggers.flush_set()
+        triggers.match('An exact line.')
+        triggers.in_loop = False
+
+        self.assertEqual(['exact'], self.hits)
+
+
+class TestAliasPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.group = aliases.create_group('test_alias_pipeline', app='sage')
+        self.hits = []
+
+    def tearDown(self):
+        aliases('test_alias_pipeline').destroy()
+
+    def _hit(self, alias):
+        self.hits.append(alias.suffix)
+
+    def test_first_word_index(self):
+        self.group.create('kill', 'startswith', 'kill ', [self._hit])
+        self.group.create('ci', 'startswith', 'Get All', [self._hit],
+            ignorecase=False)
+
+        self.assertIn('kill', aliases._word)
+        self.assertIn('get', aliases._ci_word)
+        self.assertNotIn('kill ', aliases._literal)
+
+        aliases.match('kill rat')
+        aliases.match('killer rat')
+        aliases.match('GET all')
+        aliases.match('get allsorts')
+
+        self.assertEqual(['rat', '', 'sorts'], self.hits)
+
+    def test_single_word_prefix_scanned(self):
+        self.group.create('q', 'startswith', 'q', [self._hit])
+
+        aliases.match('ql')
+
+        self.assertIn('q', aliases._literal)
+        self.assertEqual(['l'], self.hits)
+
+    def test_unindexed(self):
+        alias = self.group.create('kill', 'startswith', 'kill ')
+        alias.disable()
+
+        self.assertNotIn('kill', aliases._word)
+
+    def test_receiver(self):
+        self.group.create('kill', 'startswith', 'kill ', [self._hit])
+        self.group.create('look', 'exact', 'look', intercept=False)
+
+        self.assertEqual(None, outbound.receiver('kill rat'))
+        self.assertEqual('look', outbound.receiver('look'))
+        self.assertEqual('say hi', outbound.receiver('say hi'))
+        self.assertFalse(aliases.in_loop)
+
+    def test_flush_without_changes(self):
+        aliases.match('kill rat')
+        aliases.flush_set()
+
+        self.assertEqual(set(), aliases._to_add)
+
+
+class TestLiteralScan(unittest.TestCase):
+
+    def setUp(self):
+        self.group = triggers.create_group('test_literal', app='sage')
+        self.hits = {}
+
+    def tearDown(self):
+        triggers('test_literal').destroy()
+
+    def _hit(self, trigger):
+        self.hits[trigger.name] = (trigger.prefix, trigger.suffix)
+
+    def test_substring(self):
+        self.group.create('sub', 'substring', 'many ways', [self._hit])
+
+        triggers.match('Sage has many ways to match a line.')
+
+        self.assertEqual(('Sage has ', ' to match a line.'), self.hits['sub'])
+
+    def test_startswith_endswith(self):
+        self.group.create('start', 'startswith', 'Sage has', [self._hit])
+        self.group.create('end', 'endswith', 'a line.', [self._hit])
+        self.group.create('nostart', 'startswith', 'has', [self._hit])
+
+        triggers.match('Sage has many ways to match a line.')
+
+        self.assertEqual((None, ' many ways to match a line.'),
+            self.hits['start'])
+        self.assertEqual(('Sage has many ways to match ', None),
+            self.hits['end'])
+        self.assertNotIn('nostart', self.hits)
+
+    def test_ci_literals(self):
+        self.group.create('ci', 'substring', 'MANY Ways', [self._hit],
+            ignorecase=False)
+
+        triggers.match('Sage has many ways to match a line.')
+
+        self.assertEqual(('Sage has ', ' to match a line.'), self.hits['ci'])
+
+    def test_automaton_rebuilt(self):
+        self.group.create('first', 'substring', 'first', [self._hit])
+        triggers.match('the first line')
+
+        self.group.create('second', 'substring', 'second', [self._hit])
+        triggers.match('the second line')
+
+        self.assertIn('first', self.hits)
+        self.assertIn('second', self.hits)
+
+    def test_find_same_as_automaton(self):
+        literals = ['he', 'she', 'his', 'hers', 'ab', 'aa']
+
+        for text in ('ushers', 'abxxab', 'haystack', 'aaa'):
+            self.assertEqual(Automaton(literals).scan(text),
+                find_literals(literals, text))
+
+    def test_automaton_size(self):
+        self.group.create('sub', 'substring', 'many ways', [self._hit])
+        self.group.create('end', 'endswith', 'a line.', [self._hit])
+
+        triggers.match('Sage has many ways to match a line.')
+        found = dict(self.hits)
+        self.assertIsInstance(triggers._automatons['literal'], tuple)
+
+        self.patch(triggers, 'automaton_size', 1)
+        triggers._invalidate('literal')
+        self.hits.clear()
+        triggers.match('Sage has many ways to match a line.')
+
+        self.assertIsInstance(triggers._automatons['literal'], Automaton)
+        self.assertEqual(found, self.hits)
+
+
+class TestRegexPrefilter(unittest.TestCase):
+
+    def setUp(self):
+        self.group = triggers.create_group('test_prefilter', app='sage')
+        self.hits = []
+
+    def tearDown(self):
+        triggers('test_prefilter').destroy()
+
+    def _hit(self, trigger):
+        self.hits.append(trigger.groups)
+
+    def test_required_literal(self):
+        self.assertEqual(' says, "',
+            required_literal(re.compile(r'^(\w+) says, "(.*)"$')))
+        self.assertEqual('recovered',
+            required_literal(re.compile(r'(?:You have )?(recovered)!')))
+        self.assertEqual(None, required_literal(re.compile(r'(a|b)+')))
+        self.assertEqual(None, required_literal(re.compile(r'^\w+$')))
+
+    def test_prefiltered_regex(self):
+        trigger = self.group.create('says', 'regex', r'^(\w+) says, "(.*)"$',
+            [self._hit], ignorecase=False)
+
+        self.assertEqual('prefilter', trigger.index)
+
+        triggers.match('Ada says, "Hello."')
+        triggers.match('Ada tells you, "Hello."')
+        triggers.match('Ada tells you, "Hello."')
+
+        self.assertEqual([('Ada', 'Hello.')], self.hits)
+        self.assertEqual(1, trigger.prefilter_runs)
+        self.assertEqual(2, trigger.prefilter_skips)
+
+    def test_skips_without_parent(self):
+        trigger = self.group.create('says', 'regex', r'^(\w+) says, "(.*)"$')
+        self.patch(trigger, 'parent', weakref.ref(set()))
+
+        self.assertEqual(0, trigger.prefilter_skips)
+
+    def test_ignorecase_prefilter(self):
+        trigger = self.group.create('says', 'regex', r'^(\w+) SAYS, "(.*)"$',
+            [self._hit])
+
+        self.assertEqual('ci_prefilter', trigger.index)
+
+        triggers.match('Ada says, "Hello."')
+
+        self.assertEqual([('Ada', 'Hello.')], self.hits)
+
+    def test_fallback_without_literal(self):
+        trigger = self.group.create('word', 'regex', r'^(\w+)$',
+            [self._hit])
+
+        self.assertEqual(None, trigger.index)
+
+        triggers.match('Hello')
+
+        self.assertEqual([('Hello',)], self.hits)
+
+
+class TestGroupToggle(unittest.TestCase):
+
+    def setUp(self):
+        self.group = triggers.create_group('test_toggle', app='sage')
+        self.sub = self.group.create_group('sub')
+        self.hits = []
+
+        for group in (self.group, self.sub):
+            group.create('exact', 'exact', 'An exact line.', [self._hit])
+            group.create('regex', 'regex', r'^(\w+)$', [self._hit])
+
+    def tearDown(self):
+        triggers('test_toggle').destroy()
+
+    def _hit(self, trigger):
+        self.hits.append(trigger.parent().name)
+
+    def test_toggle_is_constant(self):
+        armed = set(triggers._armed)
+        generation = triggers.generation
+
+        self.group.disable()
+
+        self.assertEqual(armed, triggers._armed)
+        self.assertEqual(generation + 1, triggers.generation)
+        self.assertFalse(self.sub.active)
+        self.assertTrue(self.sub.enabled)
+
+    def test_redundant_toggle(self):
+        generation = triggers.generation
+
+        self.group.enable()
+        self.sub.enable()
+
+        self.assertEqual(generation, triggers.generation)
+
+        self.group.disable()
+        self.group.disable()
+
+        self.assertEqual(generation + 1, triggers.generation)
+
+    def test_disabled_subtree_skipped(self):
+        self.group.disable()
+        triggers.match('An exact line.')
+        triggers.match('Word')
+
+        self.assertEqual([], self.hits)
+
+        self.group.enable()
+        triggers.match('Word')
+
+        self.assertEqual(['sub', 'test_toggle'], sorted(self.hits))
+
+    def test_child_disable(self):
+        self.sub.disable()
+        triggers.match('An exact line.')
+
+        self.assertEqual(['test_toggle'], self.hits)
+        self.assertNotIn(self.sub('exact'), triggers.enabled)
+        self.assertIn(self.group('exact'), triggers.enabled)
+
+    def test_disabled_not_scanned(self):
+        self.sub.disable()
+
+        scanned = [instance for _, instance in triggers._active_scan()]
+
+        self.assertIn(self.group('regex'), scanned)
+        self.assertNotIn(self.sub('regex'), scanned)
+
+    def test_disabled_not_gathered(self):
+        self.sub.disable()
+
+        candidates = []
+        triggers._gather(triggers._exact['An exact line.'], candidates)
+
+        self.assertEqual([self.group('exact')],
+            [instance for _, instance, _ in candidates])
+
+    def test_enabled_while_matching(self):
+        later = self.group.create_group('later', enabled=False, priority=-1)
+        later.create('regex', 'regex', r'^(\w+)$', [self._hit])
+        later.create('sub', 'substring', 'or', [self._hit])
+        self.group.create('enable', 'regex', r'^\w+$',
+            [lambda trigger: later.enable()], priority=1)
+
+        for compiled in (False, True):
+            triggers.compile(compiled)
+            self.addCleanup(triggers.compile, False)
+            later.disable()
+            del self.hits[:]
+
+            # every kind of matchable joins from the next line on
+            triggers.match('Word')
+            self.assertEqual(['sub', 'test_toggle'], sorted(self.hits))
+
+            triggers.match('Word')
+            self.assertEqual(['later', 'later', 'sub', 'sub', 'test_toggle',
+                'test_toggle'], sorted(self.hits))
+
+    def test_create_in_disabled_group(self):
+        disabled = self.group.create_group('disabled', enabled=False)
+        disabled.create('exact', 'exact', 'A disabled line.', [self._hit])
+
+        triggers.match('A disabled line.')
+
+        self.assertEqual([], self.hits)
+
+    def test_destroy_while_matching(self):
+        def destroy(trigger):
+            trigger.parent().destroy()
+
+        self.sub.create('destroy', 'regex', r'^(\w+)$', [destroy])
+
+        triggers.in_loop = True
+        triggers.match('Word')
+        triggers.flush_set()
+        triggers.in_loop = False
+
+        self.assertNotIn('sub', self.group.groups)
+        self.assertNotIn(self.sub, triggers._scan)
+
+
+class TestProfiling(unittest.TestCase):
+
+    def setUp(self):
+        self.group = triggers.create_group('test_profile', app='sage')
+        self.group.create('exact', 'exact', 'An exact line.', [self._hit])
+        self.group.create('regex', 'regex', r'^(\w+)$', [self._hit])
+        self.original = Exact.__dict__['match']
+        triggers.profile()
+
+    def tearDown(self):
+        triggers.profile(False)
+        triggers.reset_stats()
+        triggers('test_profile').destroy()
+
+    def _hit(self, trigger):
+        pass
+
+    def test_counters(self):
+        for line in ('An exact line.', 'Word', 'Two words'):
+            triggers.match(line)
+
+        rows = dict(triggers.stats())
+
+        self.assertEqual(1, rows['test_profile/exact'].evaluations)
+        self.assertEqual(1, rows['test_profile/exact'].hits)
+        self.assertEqual(3, rows['test_profile/regex'].evaluations)
+        self.assertEqual(1, rows['test_profile/regex'].hits)
+        self.assertTrue(rows['test_profile/regex'].match_time > 0)
+
+    def test_indexed_counted_once(self):
+        self.group.create('says', 'wildcard', '* says, "*"', [self._hit])
+        triggers.match('Ada says, "Hi."')
+
+        rows = dict(triggers.stats())
+
+        self.assertEqual(1, rows['test_profile/says'].evaluations)
+        self.assertEqual(1, rows['test_profile/says'].hits)
+
+    def test_destroyed_dropped(self):
+        trigger = self.group.create('gone', 'regex', r'^Gone$', [self._hit])
+        triggers.match('Gone')
+
+        self.assertIn(trigger, profiler.records)
+
+        trigger.destroy()
+        del trigger
+        gc.collect()
+
+        self.assertNotIn('test_profile/gone', dict(triggers.stats()))
+
+    def test_sort_and_top(self):
+        triggers.match('Word')
+        triggers.match('Word')
+        triggers.match('An exact line.')
+
+        report = triggers.stats(sort='hits', top=1)
+
+        self.assertEqual(1, len(report))
+        self.assertEqual('test_profile/regex', report[0][0])
+        self.assertIn('test_profile/regex', repr(report))
+
+    def test_rollups(self):
+        triggers.match('Word')
+        triggers.match('An exact line.')
+
+        groups = dict(triggers.stats(by='group'))
+        self.assertEqual(2, groups['test_profile'].hits)
+
+        apps_ = dict(triggers.stats(by='app'))
+        self.assertEqual(2, apps_['sage'].hits)
+
+    def test_reset(self):
+        triggers.match('Word')
+        triggers.reset_stats()
+
+        self.assertEqual([], triggers.stats())
+
+    def test_disable_restores_methods(self):
+        triggers.profile(False)
+
+        self.assertEqual(self.original, Exact.__dict__['match'])
+        triggers.match('Word')
+        self.assertEqual([], triggers.stats())
+
+
+class TestMemoize(unittest.TestCase):
+
+    def setUp(self):
+        self.group = triggers.create_group('test_memo', app='sage')
+        self.results = []
+        triggers.memoize(16)
+
+    def tearDown(self):
+        triggers.memoize(None)
+        triggers('test_memo').destroy()
+
+    def _hit(self, trigger):
+        self.results.append(trigger)
+
+    def test_replay(self):
+        self.group.create('regex', 'regex', r'^(\w+) sips\.$', [self._hit])
+        self.group.create('sub', 'substring', 'sips', [self._hit])
+
+        first = triggers.match('Ada sips.')
+        second = triggers.match('Ada sips.')
+
+        regex, sub = sorted(second, key=lambda m: m.name)
+
+        self.assertEqual([m.matchable for m in first],
+            [m.matchable for m in second])
+        self.assertEqual(('Ada',), regex.groups)
+        self.assertEqual('Ada ', sub.prefix)
+        self.assertEqual(4, len(self.results))
+        self.assertEqual({'hits': 1, 'misses': 1, 'ratio': 0.5, 'size': 1},
+            triggers.cache_stats())
+
+    def test_misses_cached(self):
+        triggers.match('Nothing here.')
+        triggers.match('Nothing here.')
+
+        self.assertEqual(1, triggers.cache.hits)
+
+    def test_invalidated(self):
+        trigger = self.group.create('exact', 'exact', 'Exact.', [self._hit])
+
+        triggers.match('Exact.')
+        trigger.disable()
+        self.assertEqual([], triggers.match('Exact.'))
+
+        trigger.enable()
+        self.group.disable()
+        self.assertEqual([], triggers.match('Exact.'))
+
+        self.group.enable()
+        self.assertEqual(1, len(triggers.match('Exact.')))
+        self.assertEqual(0, triggers.cache.hits)
+
+    def test_disable_on_match(self):
+        self.group.create('exact', 'exact', 'Exact.', [self._hit],
+            disable_on_match=True)
+
+        triggers.match('Exact.')
+        triggers.match('Exact.')
+
+        self.assertEqual(1, len(self.results))
+
+    def test_wildcard(self):
+        self.group.create('says', 'wildcard', '* says, "*"', [self._hit])
+
+        triggers.match('Ada says, "Hi."')
+        replay, = triggers.match('Ada says, "Hi."')
+
+        self.assertEqual(('Ada', 'Hi.'), replay.groups)
+        self.assertEqual(2, len(self.results))
+        self.assertEqual(1, triggers.cache.hits)
+
+    def test_off(self):
+        triggers.memoize(None)
+        triggers.match('Exact.')
+
+        self.assertEqual(None, triggers.cache_stats())
+
+
+class TestPriority(unittest.TestCase):
+
+    def setUp(self):
+        self.group = triggers.create_group('test_priority', app='sage')
+        self.order = []
+
+    def tearDown(self):
+        triggers('test_priority').destroy()
+        triggers.compile(False)
+
+    def _hit(self, trigger):
+        self.order.append(trigger.name)
+
+    def test_priority_order(self):
+        low = self.group.create_group('low', priority=-1)
+        high = self.group.create_group('high', priority=10)
+
+        low.create('low_exact', 'exact', 'A rat bites you.', [self._hit])
+        self.group.create('regex', 'regex', r'^.+$', [self._hit])
+        self.group.create('sub', 'substring', 'rat', [self._hit], priority=5)
+        high.create('high_regex', 'regex', r'^A \w+ bites', [self._hit])
+
+        triggers.match('A rat bites you.')
+
+        self.assertEqual(['high_regex', 'sub', 'regex', 'low_exact'],
+            self.order)
+
+    def test_creation_order_breaks_ties(self):
+        for name in ('first', 'second', 'third'):
+            self.group.create(name, 'regex', r'^.+$', [self._hit])
+
+        triggers.match('Line.')
+
+        self.assertEqual(['first', 'second', 'third'], self.order)
+
+    def test_exclusive(self):
+        afflictions = self.group.create_group('afflictions', priority=10,
+            exclusive=True)
+
+        afflictions.create('paralysis', 'exact', 'You are paralysed.',
+            [self._hit])
+        afflictions.create('unrelated', 'regex', r'^Something else',
+            [self._hit])
+        self.group.create('anything', 'regex', r'^.+$', [self._hit])
+
+        triggers.match('You are paralysed.')
+        triggers.match('Something else.')
+        triggers.match('Nothing special.')
+
+        self.assertEqual(['paralysis', 'unrelated', 'anything'], self.order)
+
+    def test_exclusive_compiled(self):
+        triggers.compile()
+        stop = self.group.create_group('stop', priority=1, exclusive=True)
+
+        stop.create('first', 'regex', r'^.+$', [self._hit])
+        self.group.create('second', 'regex', r'^.+$', [self._hit])
+
+        triggers.match('Line.')
+        stop.exclusive = False
+        triggers.match('Line.')
+
+        self.assertEqual(['first', 'first', 'second'], self.order)
+
+    def test_decorator_priority(self):
+        @self.group.regex(r'^.+$', priority=3)
+        def decorated(trigger):
+            self.order.append('decorated')
+
+        self.group.create('plain', 'regex', r'^.+$', [self._hit])
+
+        triggers.match('Line.')
+
+        self.assertEqual(['decorated', 'plain'], self.order)
+
+
+class TestAdaptive(unittest.TestCase):
+
+    def setUp(self):
+        apps.load('dummyapp')
+        apps.meta['dummyapp'].path = self.mktemp()
+        os.mkdir(apps.meta['dummyapp'].path)
+
+        self.group = triggers.create_group('test_adaptive', app='dummyapp',
+            exclusive=True, adaptive=True)
+        self.order = []
+
+    def tearDown(self):
+        apps.unload('dummyapp')
+
+    def _hit(self, trigger):
+        self.order.append(trigger.name)
+
+    def _create(self):
+        for name in ('cold', 'warm', 'hot'):
+            self.group.create(name, 'regex', r'^(%s|any)$' % name, [self._hit])
+
+    def test_reorder(self):
+        self._create()
+
+        for _ in range(3):
+            triggers.match('hot')
+        triggers.match('warm')
+
+        triggers.reorder()
+        triggers.match('any')
+
+        self.assertEqual('hot', self.order[-1])
+        # 3 hits decayed by half, then the last one
+        self.assertEqual(2.5, self.group['hot'].rate)
+
+    def test_reorder_interval(self):
+        self._create()
+        self.patch(triggers, 'reorder_interval', 4)
+
+        triggers.match('hot')
+        triggers.match('hot')
+        triggers.match('nothing')
+        triggers.match('nothing')
+        triggers.match('any')
+
+        self.assertEqual(['hot', 'hot', 'hot'], self.order)
+
+    def test_other_groups_keep_place(self):
+        self._create()
+        before = triggers.create_group('test_before', app='dummyapp',
+            priority=0)
+        before.create('first', 'regex', r'^.*$', [self._hit])
+
+        triggers.match('hot')
+        triggers.reorder()
+
+        self.assertTrue(before['first'].order <
+            min(m.order for m in self.group.matchables.values())
+            or before['first'].order >
+            max(m.order for m in self.group.matchables.values()))
+
+    def test_persisted(self):
+        self._create()
+
+        for _ in range(3):
+            triggers.match('hot')
+
+        path = os.path.join(apps.meta['dummyapp'].path, triggers.hits_file)
+        triggers.save_hits('dummyapp')
+
+        with open(path) as f:
+            self.assertEqual({'trigger': {'test_adaptive/hot': 3.0}},
+                json.load(f))
+
+        triggers.remove_group('test_adaptive')
+        self.group = triggers.create_group('test_adaptive', app='dummyapp',
+            exclusive=True, adaptive=True)
+        self._create()
+
+        self.assertEqual(3.0, self.group['hot'].rate)
+
+        triggers.match('any')
+
+        self.assertEqual(['hot'] * 4, self.order)
+
+    def test_unwritable(self):
+        self._create()
+        triggers.match('hot')
+
+        meta = apps.meta['dummyapp']
+        self.patch(meta, 'path', os.path.join(self.mktemp(), 'missing'))
+        triggers.save_hits('dummyapp')
+
+        self.assertEqual(1, len(self.flushLoggedErrors(IOError)))
+
+
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.group = triggers.create_group('test_batch', app='sage')
+        self.hits = []
+
+    def tearDown(self):
+        triggers('test_batch').destroy()
+
+    def _hit(self, trigger):
+        self.hits.append((trigger.name, str(trigger.line), trigger.groups))
+
+    def test_batchable(self):
+        self.assertTrue(batchable(re.compile(r'^You see (\w+)\.$')))
+        self.assertTrue(batchable(re.compile(r'^a(\w+)b', re.I)))
+        self.assertFalse(batchable(re.compile(r'(?=a)b')))
+        self.assertFalse(batchable(re.compile(r'^foo(?!\s)')))
+        self.assertFalse(batchable(re.compile(r'(\w)\1')))
+        self.assertFalse(batchable(re.compile(r'(?P<who>\w+)')))
+        self.assertFalse(batchable(re.compile(r'(?<=a)b')))
+        self.assertFalse(batchable(re.compile(r'\Aa')))
+        self.assertFalse(batchable(re.compile(r'(?s)a.b')))
+
+    def test_only_batchable_batched(self):
+        self.group.create('yes', 'regex', r'^(\w+) arrives\.$', batch=True)
+        self.group.create('case', 'regex', r'^(\w+) arrives\.$', batch=True,
+            ignorecase=False)
+        self.group.create('no', 'regex', r'^(\w)\1', batch=True)
+
+        self.assertEqual('ci_batch', self.group['yes'].index)
+        self.assertEqual('batch', self.group['case'].index)
+        self.assertFalse(self.group['no'].batch)
+
+    def test_receiver(self):
+        self.group.create('arrives', 'regex', r'^(\w+) arrives\.$',
+            [self._hit], batch=True)
+        self.group.create('anyone', 'regex', r'^(\w+) \w+\.$',
+            [self._hit], batch=True)
+        self.group.create('leaves', 'regex', r'^(\w+) leaves',
+            [self._hit], batch=True)
+        self.group.create('case', 'regex', r'^(\w+) leaves',
+            [self._hit], batch=True, ignorecase=False)
+
+        inbound.receiver(['Ada arrives.', 'Nothing to see here', 'BOB LEAVES',
+            'Eve sits.'])
+
+        self.assertEqual(sorted([
+            ('arrives', 'Ada arrives.', ('Ada',)),
+            ('anyone', 'Ada arrives.', ('Ada',)),
+            ('leaves', 'BOB LEAVES', ('BOB',)),
+            ('anyone', 'Eve sits.', ('Eve',))]), sorted(self.hits))
+
+    def test_scan_buffer(self):
+        first = self.group.create('first', 'regex', r'^a', batch=True)
+        second = self.group.create('second', 'regex', r'^.', batch=True)
+
+        self.assertEqual([set([first, second]), set([second]), set()],
+            triggers.scan_buffer(['a', 'b', '']))
+
+    def test_across_lines(self):
+        self.group.create('split', 'regex', r'^foo\s+bar', [self._hit],
+            batch=True)
+        self.group.create('after', 'regex', r'^bar', [self._hit], batch=True)
+
+        inbound.receiver(['foo', 'bar', 'foo bar'])
+
+        self.assertEqual([('after', 'bar', ()), ('split', 'foo bar', ())],
+            sorted(self.hits))
+
+    def test_lookahead_at_line_end(self):
+        self.group.create('foo', 'regex', r'^foo(?!\s)', [self._hit],
+            batch=True)
+
+        inbound.receiver(['foo', 'bar'])
+
+        self.assertEqual([('foo', 'foo', ())], self.hits)
+
+    def test_many_groups(self):
+        for i in range(60):
+            self.group.create('t%d' % i, 'regex', r'^(x)(%d)$' % i,
+                [self._hit], batch=True)
+
+        inbound.receiver(['x0', 'x59', 'y1'])
+
+        self.assertTrue(len(triggers._batches['ci_batch']) > 1)
+        self.assertEqual([('t0', 'x0', ('x', '0')),
+            ('t59', 'x59', ('x', '59'))], sorted(self.hits))
+
+    def test_enabled_mid_buffer(self):
+        def enable(trigger):
+            self.group.enable('later')
+
+        self.group.create('enabler', 'exact', 'Go.', [enable])
+        self.group.create('later', 'regex', r'^Late', [self._hit],
+            enabled=False, batch=True)
+        self.group.create('other', 'regex', r'^Other', batch=True)
+
+        inbound.receiver(['Go.', 'Later.'])
+
+        self.assertEqual([('later', 'Later.', ())], self.hits)
+
+    def test_enabled_mid_buffer_every_line(self):
+        self.group.create('enabler', 'exact', 'Go.',
+            [lambda trigger: self.group.enable('later')])
+        self.group.create('later', 'regex', r'^Late', [self._hit],
+            enabled=False, batch=True)
+        self.group.create('other', 'regex', r'^Other', batch=True)
+
+        inbound.receiver(['Go.', 'Nothing.', 'Later.', 'Later still.'])
+
+        self.assertEqual([('later', 'Later.', ()),
+            ('later', 'Later still.', ())], self.hits)
+
+    def test_single_line(self):
+        self.group.create('arrives', 'regex', r'^(\w+) arrives\.$',
+            [self._hit], batch=True)
+
+        triggers.match('Ada arrives.')
+
+        self.assertEqual([('arrives', 'Ada arrives.', ('Ada',))], self.hits)
+
+
+class TestWildcard(unittest.TestCase):
+
+    def setUp(self):
+        self.group = triggers.create_group('test_wildcard', app='sage')
+        self.hits = []
+
+    def tearDown(self):
+        triggers('test_wildcard').destroy()
+
+    def _hit(self, trigger):
+        self.hits.append((trigger.name, trigger.groups))
+
+    def test_captures(self):
+        self.group.create('says', 'wildcard', '* says, "*"', [self._hit])
+
+        triggers.match('Ada says, "Hello, "friend"."')
+        triggers.match('Ada says, "Hello"!')
+        triggers.match('Ada says nothing.')
+
+        self.assertEqual([('says', ('Ada', 'Hello, "friend".'))], self.hits)
+
+    def test_same_as_regex(self):
+        wildcard = self.group.create('w', 'wildcard', 'a*b*c')
+        regex = self.group.create('r', 'regex', r'^a(.*?)b(.*?)c$',
+            ignorecase=False)
+
+        for line in ('abc', 'aXbYc', 'abbc', 'aXbYcZc', 'ab', 'bac', 'aXc',
+                'abcbc'):
+            wmatch = wildcard.match(line)
+            rmatch = regex.match(line)
+
+            self.assertEqual(bool(rmatch), bool(wmatch), line)
+
+            if rmatch:
+                self.assertEqual(rmatch.groups, wmatch.groups, line)
+
+    def test_no_wildcards(self):
+        wildcard = self.group.create('w', 'wildcard', 'Just this.')
+
+        self.assertEqual((), wildcard.match('Just this.').groups)
+        self.assertFalse(wildcard.match('Just this. And more.'))
+
+    def test_indexed(self):
+        self.group.create('lead', 'wildcard', 'You see * here.', [self._hit])
+        self.group.create('long', 'wildcard', '* bows to *.', [self._hit])
+        everything = self.group.create('all', 'wildcard', '*')
+
+        self.assertIn('You see ', triggers._literal)
+        self.assertIn(' bows to ', triggers._literal)
+        self.assertEqual(None, everything.index)
+
+        triggers.match('You see Ada here.')
+        triggers.match('Then you see Ada here.')
+        triggers.match('Bob bows to Ada.')
+
+        self.assertEqual([('lead', ('Ada',)), ('long', ('Bob', 'Ada'))],
+            self.hits)
+
+    def test_ignorecase(self):
+        @self.group.wildcard('* WAVES at *.', ignorecase=False)
+        def waves(trigger):
+            self.hits.append(trigger.groups)
+
+        triggers.match('Ada waves at Bob.')
+
+        self.assertIn(' waves at ', triggers._ci_literal)
+        self.assertEqual([('Ada', 'Bob')], self.hits)
+
+
+class TestSequence(unittest.TestCase):
+
+    def setUp(self):
+        self.group = triggers.create_group('test_sequence', app='sage')
+        self.hits = []
+
+    def tearDown(self):
+        triggers('test_sequence').destroy()
+
+    def _hit(self, trigger):
+        self.hits.append(([str(line) for line in trigger.lines],
+            trigger.groups))
+
+    def test_consecutive(self):
+        self.group.create('seq', 'sequence',
+            [r'^You see (\w+) here\.$', r'^(\w+) waves\.$'], [self._hit])
+
+        inbound.receiver(['You see Ada here.', 'Ada waves.', 'Bob waves.'])
+
+        self.assertEqual([(['You see Ada here.', 'Ada waves.'],
+            ('Ada', 'Ada'))], self.hits)
+
+    def test_gap(self):
+        self.group.create('strict', 'sequence', [r'^one$', r'^two$'],
+            [self._hit])
+        self.group.create('loose', 'sequence', [r'^one$', r'^three$'],
+            [self._hit], max_gap=1)
+
+        inbound.receiver(['one', 'other', 'two', 'one', 'two', 'three'])
+
+        self.assertEqual([(['one', 'two'], ()), (['one', 'three'], ())],
+            self.hits)
+
+    def test_gap_exceeded(self):
+        self.group.create('loose', 'sequence', [r'^one$', r'^two$'],
+            [self._hit], max_gap=1)
+
+        inbound.receiver(['one', 'a', 'b', 'two'])
+
+        self.assertEqual([], self.hits)
+
+    def test_across_buffers(self):
+        self.group.create('seq', 'sequence', [r'^a$', r'^b$', r'^c$'],
+            [self._hit])
+
+        inbound.receiver(['x', 'a'])
+        inbound.receiver(['b'])
+        inbound.receiver(['c', 'x'])
+
+        self.assertEqual([(['a', 'b', 'c'], ())], self.hits)
+
+    def test_bounded_state(self):
+        seq = self.group.create('seq', 'sequence', [r'^a$', r'^a$', r'^b$'],
+            [self._hit], max_gap=None)
+
+        inbound.receiver(['a'] * 50)
+
+        self.assertEqual(3, len(seq.partials))
+        self.assertEqual(0, len(self.hits))
+
+        inbound.receiver(['b'])
+
+        self.assertEqual([(['a', 'a', 'b'], ())], self.hits)
+
+    def test_disable_resets(self):
+        seq = self.group.create('seq', 'sequence', [r'^a$', r'^b$'],
+            [self._hit])
+
+        inbound.receiver(['a'])
+        seq.disable()
+        seq.enable()
+        inbound.receiver(['b'])
+
+        self.assertEqual([], self.hits)
+
+    def test_gag_and_decorator(self):
+        @self.group.sequence([r'^a$', r'^b$'], gag=True)
+        def gagged(trigger):
+            self.hits.append(trigger.name)
+
+        self.assertEqual([], inbound.receiver(['a', 'b']))
+        self.assertEqual(['gagged'], self.hits)
+
+
+class TestGuard(unittest.TestCase):
+
+    def setUp(self):
+        self.group = triggers.create_group('test_guard', app='sage')
+        self.messages = []
+        log.addObserver(self._observe)
+
+        # every regex seems to take a second
+        ticks = iter(range(1000))
+        self.patch(matching, 'clock', lambda: next(ticks))
+
+    def tearDown(self):
+        log.removeObserver(self._observe)
+        triggers.guard(None)
+        triggers('test_guard').destroy()
+
+    def _observe(self, event):
+        self.messages.append(' '.join(str(m) for m in event['message']))
+
+    def test_overrun(self):
+        trigger = self.group.create('slow', 'regex', r'^\w+$')
+        triggers.guard(0.5)
+
+        triggers.match('Word')
+        triggers.match('Other')
+
+        self.assertEqual({'test_guard/slow': 2},
+            triggers.budget.overruns)
+        self.assertTrue(trigger.enabled)
+        self.assertTrue(any("'test_guard/slow'" in message
+            and "'Word'" in message for message in self.messages))
+
+    def test_within_budget(self):
+        self.group.create('fast', 'regex', r'^\w+$')
+        triggers.guard(5)
+
+        triggers.match('Word')
+
+        self.assertEqual({}, triggers.budget.overruns)
+
+    def test_disable(self):
+        trigger = self.group.create('slow', 'regex', r'^\w+$')
+        triggers.guard(0.5, disable=True)
+
+        self.assertEqual(1, len(triggers.match('Word')))
+        self.assertFalse(trigger.enabled)
+        self.assertEqual([], triggers.match('Word'))
+
+    def test_off(self):
+        self.group.create('slow', 'regex', r'^\w+$')
+        triggers.guard(0.5)
+        triggers.guard(None)
+
+        triggers.match('Word')
+
+        self.assertIs(None, triggers.budget)
+        self.assertNotIn('trigger', matching._budgets)
+
+    def test_nested_quantifier(self):
+        nested = matching.nested_quantifier
+
+        self.assertTrue(nested(re.compile(r'^(a+)+$')))
+        self.assertTrue(nested(re.compile(r'^(\w*\s?)*$')))
+        self.assertTrue(nested(re.compile(r'^(?:x(a+))*$')))
+        self.assertFalse(nested(re.compile(r'^(\w+) says, "(.+)"$')))
+        self.assertFalse(nested(re.compile(r'^(a{2})+$')))
+        self.assertFalse(nested(re.compile(r'^(a|b)+$')))
+
+    def test_create_warns(self):
+        self.group.create('bad', 'regex', r'^(\w+\s?)+$')
+        self.group.create('good', 'regex', r'^(\w+)$')
+
+        warnings = [message for message in self.messages
+            if 'nested quantifiers' in message]
+
+        self.assertEqual(1, len(warnings))
+        self.assertIn("'test_guard/bad'", warnings[0])
+
+
+class TestPostOutput(unittest.TestCase):
+
+    def setUp(self):
+        self.group = triggers.create_group('test_post', app='sage')
+        self.hits = []
+        self.clock = Clock()
+        self.patch(matching, 'reactor', self.clock)
+
+    def tearDown(self):
+        triggers.pending.clear()
+        triggers._drain_call = None
+        triggers('test_post').destroy()
+
+    def _hit(self, trigger):
+        self.hits.append(trigger.line)
+
+    def _turn(self):
+        """ Run one reactor turn of post-output work """
+        call = self.clock.calls.pop(0)
+        call.func(*call.args, **call.kw)
+
+    def test_after_output(self):
+        self.group.create('later', 'exact', 'later', [self._hit],
+            post_output=True)
+        self.group.create('now', 'exact', 'now', [self._hit])
+
+        output = inbound.receiver(['later', 'now'])
+
+        self.assertEqual(['later', 'now'], output)
+        self.assertEqual(['now'], self.hits)
+
+        triggers.run_pending()
+        self.clock.advance(0)
+
+        self.assertEqual(['now', 'later'], self.hits)
+        self.assertEqual(0, len(triggers.pending))
+
+    def test_gag_before_output(self):
+        self.group.create('gagged', 'exact', 'gagged', [self._hit],
+            gag=True, post_output=True)
+
+        self.assertEqual(['kept'], inbound.receiver(['gagged', 'kept']))
+        self.assertEqual([], self.hits)
+
+        triggers.run_pending()
+        self.clock.advance(0)
+
+        self.assertEqual(['gagged'], self.hits)
+
+    def test_group_default(self):
+        group = self.group.create_group('later', post_output=True)
+        child = group.create_group('child')
+        inherits = child.create('inherits', 'exact', 'line')
+        overrides = group.create('overrides', 'exact', 'line',
+            post_output=False)
+
+        self.assertTrue(inherits.post_output)
+        self.assertFalse(overrides.post_output)
+        self.assertFalse(self.group.create('plain', 'exact', 'x').post_output)
+
+    def test_budget(self):
+        ticks = iter(range(1000))
+        self.patch(matching, 'clock', lambda: next(ticks))
+
+        self.group.create('later', 'exact', 'later', [self._hit],
+            post_output=True)
+
+        inbound.receiver(['later'] * 3)
+        triggers.run_pending()
+        triggers.run_pending()
+
+        # every call goes over budget, so each turn runs one
+        for hits in range(1, 4):
+            self.assertEqual(1, len(self.clock.calls))
+            self._turn()
+            self.assertEqual(hits, len(self.hits))
+
+        self.assertEqual([], self.clock.calls)
+
+    def test_error(self):
+        def broken(trigger):
+            raise ValueError('broken')
+
+        triggers.post(broken, None)
+        triggers.post(self.hits.append, 'after')
+
+        triggers.run_pending()
+        self.clock.advance(0)
+
+        self.assertEqual(['after'], self.hits)
+        self.assertEqual(1, len(self.flushLoggedErrors(ValueError)))
+
+
+class TestSharedPatterns(unittest.TestCase):
+
+    def setUp(self):
+        self.first = triggers.create_group('test_shared_a', app='sage')
+        self.second = triggers.create_group('test_shared_b', app='sage')
+        self.hits = []
+
+    def tearDown(self):
+        triggers.compile(False)
+        triggers('test_shared_a').destroy()
+        triggers('test_shared_b').destroy()
+
+    def _hit(self, trigger):
+        self.hits.append(trigger.matchable.parent().name)
+
+    def _create(self):
+        one = self.first.create('balance', 'regex', r'^You have (\w+)\.$',
+            [self._hit])
+        two = self.second.create('balance', 'regex', r'^You have (\w+)\.$',
+            [self._hit])
+
+        return one, two
+
+    def test_interned(self):
+        one, two = self._create()
+        other = self.first.create('other', 'regex', r'^You have (\w+)\.$',
+            ignorecase=False)
+
+        self.assertIs(one.pattern, two.pattern)
+        self.assertIsNot(one.pattern, other.pattern)
+        self.assertTrue(one.shared and two.shared)
+        self.assertFalse(other.shared)
+
+    def test_evaluated_once(self):
+        self._create()
+
+        matched = triggers.match('You have balance.')
+
+        self.assertEqual(2, len(matched))
+        self.assertIs(matched[0].matchobj, matched[1].matchobj)
+        self.assertEqual(['test_shared_a', 'test_shared_b'], sorted(self.hits))
+
+    def test_compiled(self):
+        self._create()
+        triggers.compile()
+
+        matched = triggers.match('You have balance.')
+
+        self.assertEqual(2, len(matched))
+        self.assertIs(matched[0].matchobj, matched[1].matchobj)
+        self.assertEqual([], triggers.match('You have no balance.'))
+
+    def test_enabled_per_owner(self):
+        one, two = self._create()
+
+        one.disable()
+        triggers.match('You have balance.')
+
+        self.assertFalse(two.shared)
+        self.assertEqual(['test_shared_b'], self.hits)
+
+        one.enable()
+        self.second.disable()
+        triggers.match('You have balance.')
+
+        self.assertTrue(one.shared)
+        self.assertEqual(['test_shared_b', 'test_shared_a'], self.hits)
+
+
+class TestCompiled(unittest.TestCase):
+
+    def setUp(self):
+        self.group = triggers.create_group('test_compiled', app='sage')
+        self.results = []
+        triggers.compile()
+
+    def tearDown(self):
+        triggers.compile(False)
+        triggers('test_compiled').destroy()
+
+    def _hit(self, trigger):
+        self.results.append(trigger)
+
+    def test_compiled_scan(self):
+        self.group.create('regex', 'regex', r'^(\w+)$', [self._hit])
+        self.group.create('exact', 'exact', 'Word', [self._hit])
+
+        matched = triggers.match('Word')
+
+        self.assertEqual(['exact', 'regex'],
+            sorted(match.name for match in matched))
+        self.assertEqual(('Word',), self.group['regex'].match('Word').groups)
+        self.assertEqual(3, len(self.results))
+
+    def test_rebuilt(self):
+        trigger = self.group.create('regex', 'regex', r'^\w+$')
+
+        self.assertEqual(1, len(triggers.match('Word')))
+        matcher = triggers._matcher
+
+        trigger.disable()
+        self.assertEqual([], triggers.match('Word'))
+        self.assertIsNot(matcher, triggers._matcher)
+
+        trigger.enable()
+        self.assertEqual(1, len(triggers.match('Word')))
+        matcher = triggers._matcher
+
+        self.group.disable()
+        self.assertEqual([], triggers.match('Word'))
+        self.assertIs(matcher, triggers._matcher)
+
+    def test_disable_mid_line(self):
+        def disable_other(trigger):
+            self.group.disable('second')
+
+        self.group.create('first', 'regex', r'^\w+$', [disable_other])
+        self.group.create('second', 'regex', r'^\w+$', [self._hit])
+
+        triggers.match('Word')
+
+        # whichever ran first, 'second' never runs after being disabled
+        self.assertTrue(len(self.results) <= 1)
+        self.assertFalse(self.group['second'].enabled)
+
+    def test_group_disabled_mid_run(self):
+        self.group.create('first', 'regex', r'^\w+$',
+            [lambda trigger: self.group.disable()], priority=2)
+        self.group.create('second', 'regex', r'^\w+$', [self._hit],
+            priority=1)
+        self.group.create('third', 'regex', r'^(\w+)$', [self._hit])
+
+        for compiled in (False, True):
+            triggers.compile(compiled)
+            self.group.enable()
+
+            self.assertEqual(['first'],
+                [match.name for match in triggers.match('Word')])
+            self.assertEqual([], self.results)
+
+
+class TestFoldedLine(unittest.TestCase):
+
+    def setUp(self):
+        self.group = triggers.create_group('test_folded', app='sage')
+
+    def tearDown(self):
+        triggers('test_folded').destroy()
+
+    def test_folded_cached(self):
+        line = Line('\x1b[1;31mSome LINE\x1b[0m')
+
+        self.assertEqual('some line', line.folded)
+        self.assertIs(line.folded, line.folded)
+        self.assertEqual('Some LINE', line)
+
+    def test_ci_matchables_share_fold(self):
+        self.group.create('exact', 'exact', 'SOME line', ignorecase=False)
+        self.group.create('sub', 'substring', 'ME LI', ignorecase=False)
+        self.group.create('start', 'startswith', 'some', ignorecase=False)
+        self.group.create('end', 'endswith', 'LINE', ignorecase=False)
+
+        line = Line('Some LINE')
+
+        self.assertEqual(['end', 'exact', 'start', 'sub'],
+            sorted(match.name for match in triggers.match(line)))
+        self.assertIn('folded', line.__dict__)
+
+        # the matchables themselves go through the line's folded view too
+        line = Line('Some LINE')
+        line.__dict__['folded'] = 'not it'
+
+        self.assertFalse(self.group['exact'].match(line))
+
+
+class TestMatchResults(unittest.TestCase):
+
+    def setUp(self):
+        self.group = triggers.create_group('test_results', app='sage')
+        self.results = []
+
+    def tearDown(self):
+        triggers('test_results').destroy()
+
+    def _hit(self, trigger):
+        self.results.append(trigger)
+
+    def test_results_are_separate(self):
+        self.group.create('regex', 'regex', r'^(\w+) arrives\.$', [self._hit])
+
+        triggers.match('Ada arrives.')
+        triggers.match('Bob arrives.')
+
+        self.assertEqual([('Ada',), ('Bob',)],
+            [result.groups for result in self.results])
+        self.assertEqual('Ada arrives.', self.results[0].line)
+        self.assertTrue(isinstance(self.results[0], Match))
+
+    def test_delayed_results(self):
+        clock = Clock()
+        self.patch(matching.timers, 'clock', clock)
+
+        self.group.create('sub', 'substring', ' arrives', [self._hit],
+            delay=1)
+
+        triggers.match('Ada arrives.')
+        triggers.match('Bob arrives.')
+        clock.advance(1)
+
+        self.assertEqual(['Ada', 'Bob'],
+            [result.prefix for result in self.results])
+
+    def test_cancel_delayed(self):
+        clock = Clock()
+        self.patch(matching.timers, 'clock', clock)
+
+        child = self.group.create_group('child')
+        self.group.create('sub', 'substring', ' arrives', [self._hit],
+            delay=1)
+        child.create('exact', 'exact', 'Ada arrives.', [self._hit], delay=2)
+
+        triggers.match('Ada arrives.')
+
+        self.assertEqual(2, self.group.cancel_delayed())
+        clock.advance(2)
+
+        self.assertEqual([], self.results)
+        self.assertEqual(0, len(matching.timers))
+
+    def test_result_delegates(self):
+        trigger = self.group.create('exact', 'exact', 'Exact.', [self._hit])
+
+        match = triggers.match('Exact.')[0]
+        match.disable()
+
+        self.assertEqual('exact', match.name)
+        self.assertFalse(trigger.enabled)
+        self.assertIs(self.group, match.parent())
+
+    def test_slots(self):
+        trigger = self.group.create('exact', 'exact', 'Exact.')
+
+        self.assertFalse(hasattr(trigger, '__dict__'))
+        self.assertFalse(hasattr(triggers.match('Exact.')[0], '__dict__'))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,14 +1,27 @@
 from twisted.trial import unittest
 import sys
 sys.path.append('../')
-from sage.net import TelnetClient, IAC, GA, ISageProxyReceiver
-from sage import player
+from sage.net import TelnetClient, TelnetServer, IAC, GA, \
+    ISageProxyReceiver
+from sage import net, player
+import sage
+from twisted.internet.task import Clock
+from twisted.python import log
+from twisted.test.proto_helpers import StringTransport
 import json
+import os
+import zlib
 
 IAC = chr(255)
 SB = chr(250)
 SE = chr(240)
 GMCP = chr(201)
+WILL = chr(251)
+EORD = chr(239)
+COMPRESS2 = chr(86)
+WONT = chr(252)
+DO = chr(253)
+DONT = chr(254)
 
 
 class Achaea(object):
@@ -74,11 +87,368 @@ class TelnetTests(unittest.TestCase):
         self.assertIn('test', self.receiver.lines)
         self.assertEqual('prompt', self.receiver.prompt)
 
+    def test_crlf_split(self):
+        self.client.write_raw('first\r')
+        self.client.write_raw('\nsecond\r\nprompt' + IAC + GA)
+        self.assertEqual(['first', 'second'], self.receiver.lines)
+        self.assertEqual('prompt', self.receiver.prompt)
+
     """
     def test_gmcp_name(self):
         self.a.gmcp('Char.Name', {'name': 'Test', 'fullname': 'Full Name Test'})
         self.assertEqual(player.name, 'Test')
     """
 
+class InputRecorder(ISageProxyReceiver):
+
+    def __init__(self):
+        super(InputRecorder, self).__init__()
+        self.inputs = []
+
+    def input(self, lines, prompt):
+        self.inputs.append((lines, prompt))
+
+
+class SegmentTests(unittest.TestCase):
+
+    def setUp(self):
+        self.patch(sage.config, 'max_segment_size', 100)
+        self.client = TestClient()
+        self.receiver = InputRecorder()
+        self.client.addReceiver(self.receiver)
+
+    def test_small(self):
+        self.client.write_raw('one\r\ntwo\r\nprompt' + IAC + GA)
+
+        self.assertEqual([(['one', 'two'], 'prompt')], self.receiver.inputs)
+        self.assertEqual([], self.client.data_chunks)
+
+    def test_partial_flush(self):
+        lines = ['line %02d of a long listing' % i for i in range(20)]
+
+        for line in lines:
+            self.client.write_raw(line + '\r\n')
+
+        self.assertTrue(len(self.receiver.inputs) > 1)
+        self.assertTrue(self.client.data_size <= 100)
+        self.assertEqual(set([None]),
+            set(prompt for _, prompt in self.receiver.inputs))
+
+        self.client.write_raw('prompt' + IAC + GA)
+
+        self.assertEqual(lines,
+            sum((sent for sent, _ in self.receiver.inputs), []))
+        self.assertEqual('prompt', self.receiver.inputs[-1][1])
+
+    def test_long_line(self):
+        self.client.write_raw('\r\n' + 'x' * 150)
+
+        self.assertEqual([(['x' * 150], None)], self.receiver.inputs)
+
+        self.client.write_raw('\r\nprompt' + IAC + GA)
+
+        self.assertEqual(([], 'prompt'), self.receiver.inputs[-1])
+
+    def test_deferred_to_prompt(self):
+        called = []
+        sage.defer_to_prompt(called.append, 'prompt')
+
+        self.client.write_raw('x' * 60 + '\r\n' + 'y' * 60 + '\r\n')
+
+        self.assertEqual([], called)
+
+        self.client.write_raw('prompt' + IAC + GA)
+
+        self.assertEqual(['prompt'], called)
+
+
+class StreamTests(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.patch(net, 'reactor', self.clock)
+        self.patch(sage.config, 'stream_output', True)
+        self.patch(sage.config, 'stream_lines', 3)
+        self.patch(sage.config, 'stream_ms', 50)
+        self.client = TestClient()
+        self.receiver = InputRecorder()
+        self.client.addReceiver(self.receiver)
+
+    def test_off(self):
+        sage.config.stream_output = False
+
+        self.client.write_raw('a\r\nb\r\nc\r\nd\r\n')
+        self.clock.advance(1)
+
+        self.assertEqual([], self.receiver.inputs)
+
+    def test_lines(self):
+        self.client.write_raw('a\r\nb\r\n')
+        self.client.write_raw('c\r\nd')
+
+        self.assertEqual([(['a', 'b', 'c'], None)], self.receiver.inputs)
+
+        self.client.write_raw('\r\nprompt' + IAC + GA)
+
+        self.assertEqual((['d'], 'prompt'), self.receiver.inputs[-1])
+        self.assertEqual([], self.clock.getDelayedCalls())
+
+    def test_prompt_in_packet(self):
+        self.client.write_raw('a\r\nb\r\nc\r\nd\r\nprompt' + IAC + GA)
+
+        self.assertEqual([(['a', 'b', 'c', 'd'], 'prompt')],
+            self.receiver.inputs)
+
+    def test_timeout(self):
+        self.client.write_raw('a\r\npart')
+        self.clock.advance(0.05)
+
+        self.assertEqual([(['a'], None)], self.receiver.inputs)
+        self.assertEqual(0.05, self.client.first_line_time)
+
+        # an incomplete line waits for the rest of it
+        self.clock.advance(1)
+        self.client.write_raw('ial')
+        self.clock.advance(1)
+
+        self.assertEqual(1, len(self.receiver.inputs))
+
+        self.client.write_raw('\r\nprompt' + IAC + GA)
+
+        self.assertEqual((['partial'], 'prompt'), self.receiver.inputs[-1])
+
+    def test_logged(self):
+        messages = []
+        log.addObserver(messages.append)
+        self.addCleanup(log.removeObserver, messages.append)
+
+        self.client.write_raw('a\r\nb\r\nc\r\nd')
+        self.client.write_raw('\r\nprompt' + IAC + GA)
+
+        self.assertTrue(any('Sent 3 lines before the prompt' in
+            ' '.join(message['message']) for message in messages))
+
+    def test_outbound_signal(self):
+        sent = []
+
+        def outbound(**kwargs):
+            sent.append((kwargs['lines'], kwargs['prompt']))
+
+        net.signal.pre_outbound.connect(outbound)
+        self.addCleanup(net.signal.pre_outbound.disconnect, outbound)
+
+        self.client.write_raw('a\r\nb\r\nc\r\nd')
+        self.client.write_raw('\r\nprompt' + IAC + GA)
+
+        self.assertEqual([(['a', 'b', 'c'], None), (['d'], 'prompt')], sent)
+
+
+class Recorder(TelnetClient):
+    """ Records what the parser found """
+
+    def __init__(self):
+        TelnetClient.__init__(self)
+        self.calls = []
+
+    def applicationDataReceived(self, data):
+        # application data may be delivered in any number of pieces
+        if self.calls and self.calls[-1][0] == 'data':
+            self.calls[-1] = ('data', self.calls[-1][1] + data)
+        else:
+            self.calls.append(('data', data))
+
+    def commandReceived(self, command, argument):
+        self.calls.append(('command', command, argument))
+
+    def negotiate(self, commands):
+        self.calls.append(('negotiate', commands))
+
+    def segmentReceived(self):
+        self.calls.append(('segment',))
+
+
+class ParserTests(unittest.TestCase):
+
+    stream = ('line one\r\nline\r\0two\r\n' + IAC + IAC + 'x\r\n' +
+        IAC + WILL + GMCP + IAC + SB + GMCP + 'Core.Ping ' + IAC + IAC +
+        IAC + SE + 'prompt\r' + IAC + GA + 'next\rline' + IAC + EORD)
+
+    expected = [
+        ('data', 'line one\nline\rtwo\n' + IAC + 'x\n'),
+        ('command', WILL, GMCP),
+        ('negotiate', list(GMCP + 'Core.Ping ' + IAC)),
+        ('data', 'prompt\r'),
+        ('command', GA, None),
+        ('segment',),
+        ('data', 'next\rline'),
+        ('command', EORD, None),
+        ('segment',)]
+
+    def feed(self, size):
+        client = Recorder()
+
+        for i in range(0, len(self.stream), size):
+            client.dataReceived(self.stream[i:i + size])
+
+        return client.calls
+
+    def test_whole(self):
+        self.assertEqual(self.expected, self.feed(len(self.stream)))
+
+    def test_split(self):
+        for size in range(1, 12):
+            self.assertEqual(self.expected, self.feed(size))
+
+    def test_plain(self):
+        client = Recorder()
+        client.dataReceived('no commands at all')
+        self.assertEqual([('data', 'no commands at all')], client.calls)
+
+
+class MCCPRecorder(Recorder):
+    """ Negotiates for real, recording GMCP instead of processing it """
+
+    negotiate = TelnetClient.negotiate
+
+    def gmcpReceived(self, data):
+        self.calls.append(('gmcp', ''.join(data)))
+
+
+class MCCPTests(unittest.TestCase):
+
+    prompt = [('command', GA, None), ('segment',)]
+
+    # recorded from a server that compresses after the login prompt, flushes
+    # on a prompt and ends the stream before the last line
+    expected = [('data', 'Welcome to Achaea.\nlogin:')] + prompt + [
+        ('command', WILL, COMPRESS2),
+        ('data', 'You see a granite statue here.\nA breeze blows.\n'),
+        ('gmcp', 'Char.Vitals {"hp": "3120"}'),
+        ('data', '3120h, 2870m ex-')] + prompt + [
+        ('data', 'Ada arrives from the north.\n' * 20 + '3120h, 2870m ex-')
+        ] + prompt + [
+        ('data', 'Compression ended.\n3120h, 2870m ex-')] + prompt
+
+    def setUp(self):
+        path = os.path.join(os.path.dirname(__file__), 'data', 'mccp2.bin')
+        with open(path, 'rb') as f:
+            self.stream = f.read()
+
+    def feed(self, size):
+        client = MCCPRecorder()
+
+        for i in range(0, len(self.stream), size):
+            client.dataReceived(self.stream[i:i + size])
+
+        self.assertFalse(client.compress)
+
+        return client.calls
+
+    def test_whole(self):
+        self.assertEqual(self.expected, self.feed(len(self.stream)))
+
+    def test_split(self):
+        for size in range(1, 40):
+            self.assertEqual(self.expected, self.feed(size))
+
+    def test_corrupt(self):
+        client = MCCPRecorder()
+        client.transport = StringTransport()
+
+        client.dataReceived(IAC + SB + COMPRESS2 + IAC + SE + 'not zlib')
+
+        self.assertFalse(client.compress)
+        self.assertTrue(client.transport.disconnecting)
+
+
+class Factory(object):
+
+    def __init__(self):
+        self.transports = []
+
+
+class CompressionTests(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.patch(net, 'reactor', self.clock)
+        self.patch(sage, '_echo', None)
+
+        self.client = TestClient()
+        self.client.connected = True
+
+        self.server = TelnetServer(self.client)
+        self.server.factory = Factory()
+        self.server.makeConnection(StringTransport())
+        self.transport = self.server.transport
+
+    def tearDown(self):
+        self.client.receivers.remove(self.server)
+
+    def accept(self):
+        self.transport.clear()
+        self.server.dataReceived(IAC + DO + COMPRESS2)
+        self.clock.advance(0)
+
+        start = IAC + SB + COMPRESS2 + IAC + SE
+        self.assertEqual(start, self.transport.value()[:len(start)])
+
+        self.decompressobj = zlib.decompressobj()
+        self.sent = len(start)
+
+    def received(self):
+        """ Decompress everything sent since the last call """
+        data = self.transport.value()[self.sent:]
+        self.sent += len(data)
+        return self.decompressobj.decompress(data)
+
+    def test_offered(self):
+        self.assertIn(IAC + WILL + COMPRESS2, self.transport.value())
+
+    def test_refused(self):
+        self.server.dataReceived(IAC + DONT + COMPRESS2)
+        self.clock.advance(0)
+
+        self.server.input(['line'], 'prompt')
+
+        self.assertIs(None, self.server.compressobj)
+        self.assertTrue(self.transport.value().endswith(
+            'line\r\nprompt' + IAC + EORD))
+
+    def test_flush_on_prompt(self):
+        self.accept()
+
+        self.server.input(['A statue stands here.'] * 50, 'prompt')
+
+        self.assertEqual('A statue stands here.\r\n' * 50 + 'prompt' +
+            IAC + EORD, self.received())
+        self.assertEqual([], self.clock.getDelayedCalls())
+        self.assertTrue(self.server.compression_ratio > 10)
+        self.assertEqual(self.server.bytes_compressed, self.sent - 5)
+
+    def test_flush_later(self):
+        self.accept()
+
+        self.server.write('echoed\n')
+        self.server.write('again\n')
+
+        self.assertEqual('', self.received())
+
+        self.clock.advance(0)
+
+        self.assertEqual('echoed\nagain\n', self.received())
+
+    def test_end(self):
+        self.accept()
+
+        self.server.write('compressed\n')
+        self.server.dataReceived(IAC + DONT + COMPRESS2)
+        self.server.write('plain\n')
+
+        self.assertEqual('compressed\n', self.received())
+        self.assertEqual(IAC + WONT + COMPRESS2 + 'plain\n',
+            self.decompressobj.unused_data)
+
+
 if __name__ == '__main__':
     unittest.main()